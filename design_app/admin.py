@@ -1,14 +1,23 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
+from .categories import CategoryListFilter
+from .counters import get_counters
+from .deletion import request_category_deletion
 from .models import CustomUser, DesignCategory, DesignRequest
+from .pagination import BoundedCountPaginator
+from .search import build_match, matching_ids_sql, search_available
+from .transitions import bulk_transition
 
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'fio', 'email', 'is_staff')
-    list_filter = ('is_staff', 'username')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('username', 'fio', 'email')
+    # Миллионы пользователей: без точного COUNT(*) на каждой странице
+    paginator = BoundedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
@@ -31,16 +40,46 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(DesignCategory)
 class DesignCategoryAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'deletion_requested_at')
     search_fields = ('name',)
 
+    def get_deleted_objects(self, objs, request):
+        # Без обхода всех связанных заявок: для большой категории это тысячи объектов в памяти
+        objs = list(objs)
+        model_count = {
+            DesignCategory._meta.verbose_name_plural: len(objs),
+            DesignRequest._meta.verbose_name_plural: DesignRequest.objects.filter(category__in=objs).count(),
+        }
+        perms_needed = set()
+        if not request.user.has_perm('design_app.delete_designrequest'):
+            perms_needed.add(DesignRequest._meta.verbose_name)
+        return [str(obj) for obj in objs], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        request_category_deletion([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        request_category_deletion(queryset.values_list('id', flat=True))
+
+
+class DesignRequestPaginator(BoundedCountPaginator):
+    def unfiltered_count(self):
+        return get_counters()['total']
+
 
 @admin.register(DesignRequest)
 class DesignRequestAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'category', 'status', 'created_at')
-    list_filter = ('status', 'category', 'created_at')
+    list_select_related = ('user', 'category')
+    list_filter = ('status', ('category', CategoryListFilter), 'created_at')
+    # Переходы по датам строятся по дневным сводкам (шаблон change_list.html этой модели)
+    date_hierarchy = 'created_at'
     search_fields = ('title', 'user__username', 'user__fio')
     readonly_fields = ('created_at',)
+    autocomplete_fields = ('user',)
+    paginator = DesignRequestPaginator
+    show_full_result_count = False
+    actions = ('mark_accepted', 'mark_completed')
 
     fieldsets = (
         (None, {
@@ -49,4 +88,29 @@ class DesignRequestAdmin(admin.ModelAdmin):
         ('Статус и дополнительные данные', {
             'fields': ('status', 'admin_comment', 'design_image', 'created_at')
         }),
-    )
\ No newline at end of file
+    )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'category':
+            kwargs['queryset'] = DesignCategory.objects.filter(deletion_requested_at__isnull=True)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_available() and build_match(search_term):
+            return queryset.filter(id__in=matching_ids_sql(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def _bulk_transition(self, request, queryset, new_status):
+        updated, errors = bulk_transition(queryset.values_list('id', flat=True), new_status)
+        if updated:
+            self.message_user(request, f'Статус изменен у заявок: {len(updated)}', messages.SUCCESS)
+        for pk, item_errors in sorted(errors.items()):
+            self.message_user(request, f'Заявка №{pk}: {"; ".join(item_errors)}', messages.ERROR)
+
+    @admin.action(description='Принять в работу выбранные заявки')
+    def mark_accepted(self, request, queryset):
+        self._bulk_transition(request, queryset, 'accepted')
+
+    @admin.action(description='Отметить выбранные заявки выполненными')
+    def mark_completed(self, request, queryset):
+        self._bulk_transition(request, queryset, 'completed')
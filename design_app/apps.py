@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DesignAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'design_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
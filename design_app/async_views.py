@@ -0,0 +1,112 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_safe
+
+from .cache import aversioned
+from .counters import aget_counters
+from .exports import aiterate, export_response
+from .live import live_response
+from .models import DesignRequest
+from .pagination import akeyset_page
+from .rollups import acached_analytics, parse_days
+from .search import ranked, search_available
+
+# Шаблоны рендерятся в потоке: контекст-процессоры auth и messages обращаются к БД синхронно
+arender = sync_to_async(render)
+
+
+async def is_admin(user):
+    return user.is_staff
+
+
+@login_required
+@user_passes_test(is_admin)
+async def admin_dashboard(request):
+    counters = await aget_counters()
+
+    context = {
+        'total_requests': counters['total'],
+        'new_requests_count': counters['new'],
+        'accepted_requests_count': counters['accepted'],
+        'completed_requests_count': counters['completed'],
+        'categories_count': counters['categories'],
+        'analytics': await acached_analytics(),
+    }
+    return await arender(request, 'design_app/admin_dashboard.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_safe
+async def analytics_view(request):
+    return JsonResponse(await acached_analytics(parse_days(request.GET.get('days'))))
+
+
+@login_required
+@user_passes_test(is_admin)
+async def admin_requests(request):
+    status_filter = request.GET.get('status', '')
+    cursor = request.GET.get('after', '')
+    search_query = request.GET.get('q', '').strip()
+
+    design_requests = DesignRequest.objects.select_related('user', 'category')
+    if status_filter:
+        design_requests = design_requests.filter(status=status_filter)
+
+    if search_query and search_available():
+        design_requests, next_cursor = await sync_to_async(ranked)(design_requests, search_query), None
+    else:
+        design_requests, next_cursor = await akeyset_page(design_requests, cursor)
+
+    context = {
+        'design_requests': design_requests,
+        'current_filter': status_filter,
+        'search_query': search_query,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+    }
+    return await arender(request, 'design_app/admin_requests.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_safe
+async def export_requests(request, fmt):
+    return export_response(request, fmt, stream=aiterate)
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_safe
+async def live_events(request):
+    return await live_response(request)
+
+
+async def _index_data():
+    completed_requests = DesignRequest.objects.filter(
+        status='completed'
+    ).select_related('category').order_by('-created_at')[:4]
+
+    return {
+        'completed_requests': [design_request async for design_request in completed_requests],
+        'in_progress_count': (await aget_counters())['accepted'],
+    }
+
+
+async def index(request):
+    context = await aversioned('index', _index_data)
+    return await arender(request, 'design_app/index.html', context)
+
+
+@login_required
+async def profile_view(request):
+    user = await request.auser()
+    if user.is_staff:
+        return redirect('design_app:admin_dashboard')
+
+    user_requests = DesignRequest.objects.filter(user=user).select_related('category')
+    return await arender(request, 'design_app/profile.html', {
+        'user_requests': [design_request async for design_request in user_requests],
+    })
@@ -0,0 +1,55 @@
+import time
+import types
+from contextlib import contextmanager
+
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import include, path
+
+
+@contextmanager
+def benchmark_environment(verbosity=0):
+    # Тестовая БД: сидирование и логины не трогают рабочую базу
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def build_urlconf(use_async_views):
+    from .urls import build_urlpatterns
+
+    urlconf = types.ModuleType(f'design_app_benchmark_urls_{int(use_async_views)}')
+    urlconf.urlpatterns = [path('', include((build_urlpatterns(use_async_views), 'design_app')))]
+    return urlconf
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def read_body(response):
+    # Потоковые ответы (выгрузки, SSE) выполняют запросы к БД и рендеринг при чтении тела
+    if response.streaming:
+        return len(b''.join(response.streaming_content))
+    return len(response.content)
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
@@ -0,0 +1,84 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+REQUESTS_VERSION_KEY = 'design_app:requests_version'
+CATEGORIES_VERSION_KEY = 'design_app:categories_version'
+INDEX_CACHE_TIMEOUT = 60 * 60
+
+
+def _initial_version():
+    # Если ключ версии вытеснен из кэша, новая версия не должна совпасть ни с одной из прежних
+    return time.time_ns() // 1000
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+
+
+def get_requests_version():
+    return get_version(REQUESTS_VERSION_KEY)
+
+
+def bump_requests_version():
+    bump_version(REQUESTS_VERSION_KEY)
+
+
+def get_categories_version():
+    return get_version(CATEGORIES_VERSION_KEY)
+
+
+def bump_categories_version():
+    bump_version(CATEGORIES_VERSION_KEY)
+
+
+async def aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _initial_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+async def aget_requests_version():
+    return await aget_version(REQUESTS_VERSION_KEY)
+
+
+async def aget_categories_version():
+    return await aget_version(CATEGORIES_VERSION_KEY)
+
+
+def invalidate(callback):
+    # Сбрасываем сразу и ещё раз после коммита: до коммита другой запрос мог закэшировать старые данные
+    callback()
+    transaction.on_commit(callback)
+
+
+def versioned(key, producer, timeout=INDEX_CACHE_TIMEOUT):
+    versioned_key = f'design_app:{key}:v{get_requests_version()}'
+    value = cache.get(versioned_key)
+    if value is None:
+        value = producer()
+        cache.set(versioned_key, value, timeout)
+    return value
+
+
+async def aversioned(key, producer, timeout=INDEX_CACHE_TIMEOUT):
+    versioned_key = f'design_app:{key}:v{await aget_requests_version()}'
+    value = await cache.aget(versioned_key)
+    if value is None:
+        value = await producer()
+        await cache.aset(versioned_key, value, timeout)
+    return value
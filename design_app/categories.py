@@ -0,0 +1,73 @@
+import threading
+import time
+
+from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceField, ModelChoiceIterator
+
+from .cache import get_categories_version
+from .models import DesignCategory
+
+# Категории меняются редко: держим их в памяти процесса и перечитываем, когда в общем кэше
+# сменилась версия (её поднимают сигналы DesignCategory) или прошло CATEGORIES_TTL секунд —
+# на случай, если кэш не общий и версию подняли в другом процессе
+CATEGORIES_TTL = 60
+_lock = threading.Lock()
+_state = {'version': None, 'loaded_at': 0.0, 'categories': ()}
+
+
+def _fresh(version):
+    return _state['version'] == version and time.monotonic() - _state['loaded_at'] < CATEGORIES_TTL
+
+
+def get_categories():
+    version = get_categories_version()
+    if _fresh(version):
+        return _state['categories']
+    with _lock:
+        if not _fresh(version):
+            # Версию прочитали до запроса: изменение во время загрузки поднимет её, и список перечитается
+            categories = tuple(DesignCategory.objects.filter(deletion_requested_at__isnull=True))
+            _state.update(version=version, loaded_at=time.monotonic(), categories=categories)
+        return _state['categories']
+
+
+class CachedCategoryIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for category in get_categories():
+            yield self.choice(category)
+
+    def __len__(self):
+        return len(get_categories()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(get_categories())
+
+
+class CategoryChoiceField(ModelChoiceField):
+    iterator = CachedCategoryIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            pk = None
+        # Список в памяти годится для вывода, но выбор сверяем с БД: категорию могли удалить
+        # в другом процессе, и вставка заявки упала бы на внешнем ключе
+        category = pk and DesignCategory.objects.filter(pk=pk, deletion_requested_at__isnull=True).first()
+        if category is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return category
+
+
+class CategoryListFilter(admin.RelatedFieldListFilter):
+    def field_choices(self, field, request, model_admin):
+        return [(category.pk, str(category)) for category in get_categories()]
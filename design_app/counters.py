@@ -0,0 +1,55 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+
+from .models import DesignCategory, DesignRequest, RequestCounter
+from .routers import use_primary
+
+STATUSES = [status for status, _ in DesignRequest.STATUS_CHOICES]
+COUNTER_NAMES = ['total', *STATUSES, 'categories']
+
+
+def adjust_counters(deltas):
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Одним UPDATE для всех счётчиков, а не запросом на каждый
+    RequestCounter.objects.filter(name__in=deltas).update(
+        value=F('value') + Case(*(When(name=name, then=Value(delta)) for name, delta in deltas.items()), default=Value(0))
+    )
+
+
+def record_status_change(old_status, new_status, count=1):
+    if old_status == new_status:
+        return
+    adjust_counters({old_status: -count, new_status: count})
+
+
+def rebuild_counters():
+    aggregates = {'total': Count('id')}
+    for status in STATUSES:
+        aggregates[status] = Count('id', filter=Q(status=status))
+
+    # Категории, помеченные на удаление, и их заявки не учитываются (см. request_category_deletion)
+    with use_primary():
+        values = DesignRequest.objects.filter(category__deletion_requested_at__isnull=True).aggregate(**aggregates)
+        values['categories'] = DesignCategory.objects.filter(deletion_requested_at__isnull=True).count()
+
+    with transaction.atomic():
+        for name, value in values.items():
+            RequestCounter.objects.update_or_create(name=name, defaults={'value': value})
+    return values
+
+
+def get_counters():
+    values = dict(RequestCounter.objects.values_list('name', 'value'))
+    if any(name not in values for name in COUNTER_NAMES):
+        values = rebuild_counters()
+    return values
+
+
+async def aget_counters():
+    values = {name: value async for name, value in RequestCounter.objects.values_list('name', 'value')}
+    if any(name not in values for name in COUNTER_NAMES):
+        values = await sync_to_async(rebuild_counters)()
+    return values
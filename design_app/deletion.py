@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .cache import bump_categories_version, bump_requests_version, invalidate
+from .counters import adjust_counters
+from .models import DailyRequestRollup, DesignCategory, DesignRequest
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK_SIZE = 200
+
+_worker_lock = threading.Lock()
+_purging = ContextVar('design_app_purging_category', default=False)
+
+
+def purging_category():
+    # Заявки удаляемой категории вычтены из счётчиков и сводок ещё при пометке категории
+    return _purging.get()
+
+
+def pending_categories():
+    return DesignCategory.objects.filter(deletion_requested_at__isnull=False).order_by('deletion_requested_at')
+
+
+def pending_category_ids(category_ids):
+    # Заявки этих категорий уже не в счётчиках и сводках: их изменения там не отражаются
+    return set(pending_categories().filter(id__in=category_ids).values_list('id', flat=True))
+
+
+def request_category_deletion(category_ids):
+    # Сама категория и её заявки удаляются позже, порциями; сейчас категория скрывается
+    # и сразу пропадает из счётчиков и аналитики
+    with use_primary(), transaction.atomic():
+        category_ids = list(DesignCategory.objects.filter(
+            id__in=category_ids, deletion_requested_at__isnull=True,
+        ).values_list('id', flat=True))
+        if not category_ids:
+            return 0
+        DesignCategory.objects.filter(id__in=category_ids).update(deletion_requested_at=timezone.now())
+
+        deltas = {'categories': -len(category_ids)}
+        statuses = DesignRequest.objects.filter(category__in=category_ids).values_list('status').annotate(count=Count('id'))
+        for status, count in statuses.order_by():
+            deltas[status] = -count
+            deltas['total'] = deltas.get('total', 0) - count
+        adjust_counters(deltas)
+        DailyRequestRollup.objects.filter(category__in=category_ids).delete()
+
+    invalidate(bump_requests_version)
+    invalidate(bump_categories_version)
+    if getattr(settings, 'CATEGORY_DELETION_IN_BACKGROUND', True):
+        transaction.on_commit(start_deletion_worker)
+    return len(category_ids)
+
+
+def purge_category(category, chunk_size=DELETE_CHUNK_SIZE, pause=0):
+    # Каждая порция — отдельная короткая транзакция: память не растёт, запись в SQLite не блокируется надолго
+    requests = DesignRequest.objects.filter(category=category).order_by('id')
+    deleted = 0
+    while True:
+        with use_primary(), transaction.atomic():
+            ids = list(requests.values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                category.delete()
+                return deleted
+            # delete() посылает post_delete: файлы и версия кэша обновляются по каждой заявке
+            token = _purging.set(True)
+            try:
+                deleted += DesignRequest.objects.filter(id__in=ids).delete()[1].get(DesignRequest._meta.label, 0)
+            finally:
+                _purging.reset(token)
+        if pause:
+            time.sleep(pause)
+
+
+def purge_pending_categories(chunk_size=DELETE_CHUNK_SIZE, pause=0):
+    purged = {}
+    with use_primary():
+        for category in pending_categories():
+            purged[category.name] = purge_category(category, chunk_size, pause)
+    return purged
+
+
+def resume_deletion_worker():
+    # Поток живёт в процессе: после перезапуска удаление продолжается с первым запросом нового процесса
+    if getattr(settings, 'CATEGORY_DELETION_IN_BACKGROUND', True):
+        with use_primary():
+            if pending_categories().exists():
+                start_deletion_worker()
+
+
+def start_deletion_worker():
+    # Один фоновый поток на процесс; то, что он не успел (перезапуск процесса), доделает purge_categories
+    if not _worker_lock.acquire(blocking=False):
+        return
+    threading.Thread(target=_run_worker, name='design-app-category-deletion', daemon=True).start()
+
+
+def _run_worker():
+    try:
+        with use_primary():
+            while pending_categories().exists():
+                purge_pending_categories()
+    except Exception:
+        logger.exception('Не удалось удалить категории в фоне')
+    finally:
+        connections.close_all()
+        _worker_lock.release()
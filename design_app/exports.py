@@ -0,0 +1,169 @@
+import csv
+import json
+import logging
+import os
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+
+from .models import DesignRequest
+from .search import matching_ids_sql, search_available
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('category', 'category__name'),
+    ('username', 'user__username'),
+    ('fio', 'user__fio'),
+    ('email', 'user__email'),
+    ('status', 'status'),
+    ('admin_comment', 'admin_comment'),
+    ('created_at', 'created_at'),
+    ('image', 'image'),
+    ('design_image', 'design_image'),
+]
+HEADERS = [header for header, _ in EXPORT_FIELDS]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'requests.csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'requests.ndjson'),
+    'zip': ('application/zip', 'request_images.zip'),
+}
+
+
+def export_queryset(status='', search_query=''):
+    queryset = DesignRequest.objects.order_by('id')
+    if status:
+        queryset = queryset.filter(status=status)
+    if search_query and search_available():
+        queryset = queryset.filter(id__in=matching_ids_sql(search_query))
+    return queryset
+
+
+def _rows(queryset):
+    # values_list + iterator: строки читаются из курсора порциями, без моделей и кэша QuerySet
+    return queryset.values_list(*(lookup for _, lookup in EXPORT_FIELDS)).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _batched(rows, size=EXPORT_CHUNK_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def _safe_cell(value):
+    # Текст, начинающийся с =, +, -, @, табуляции или CR, Excel считает формулой: экранируем апострофом
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(queryset):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel открывал кириллицу в UTF-8
+    yield '\ufeff' + writer.writerow(HEADERS)
+    for batch in _batched(_rows(queryset)):
+        yield ''.join(writer.writerow([_safe_cell(value) for value in row]) for row in batch)
+
+
+def iter_ndjson(queryset):
+    for batch in _batched(_rows(queryset)):
+        yield ''.join(
+            json.dumps(dict(zip(HEADERS, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+            for row in batch
+        )
+
+
+class StreamBuffer:
+    """Файлоподобный объект без seek/tell: zipfile пишет в него архив потоком, с дескрипторами данных."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self.chunks:
+            data = b''.join(self.chunks)
+            self.chunks = []
+            yield data
+
+
+def iter_zip(queryset):
+    """Архив изображений заявок потоком: содержимое файлов в памяти не копится.
+
+    В отличие от CSV и NDJSON память всё же растёт с числом файлов: ZipFile хранит ZipInfo
+    каждой записи (несколько сотен байт) до конца выгрузки, чтобы записать центральный каталог.
+    Для выгрузки всех заявок за годы стоит сузить выборку фильтром по статусу или поиском.
+    """
+    buffer = StreamBuffer()
+    storage = DesignRequest._meta.get_field('image').storage
+    files = queryset.values_list('id', 'image', 'design_image').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    # Изображения уже сжаты, поэтому ZIP_STORED: без лишней нагрузки на CPU
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for pk, *names in files:
+            for kind, name in zip(('image', 'design_image'), names):
+                if not name:
+                    continue
+                arcname = f'{pk}/{kind}{os.path.splitext(name)[1]}'
+                try:
+                    source = storage.open(name, 'rb')
+                except OSError:
+                    logger.warning('Файл %s заявки %s не найден, пропускаем', name, pk)
+                    continue
+                with source, archive.open(arcname, 'w', force_zip64=True) as target:
+                    for chunk in source.chunks(FILE_CHUNK_SIZE):
+                        target.write(chunk)
+                        yield from buffer.drain()
+                yield from buffer.drain()
+    yield from buffer.drain()
+
+
+EXPORTERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+    'zip': iter_zip,
+}
+
+
+def export_response(request, fmt, stream=iter):
+    if fmt not in EXPORTERS:
+        raise Http404('Неизвестный формат выгрузки')
+    content_type, filename = EXPORT_FORMATS[fmt]
+    queryset = export_queryset(request.GET.get('status', ''), request.GET.get('q', '').strip())
+    response = StreamingHttpResponse(stream(EXPORTERS[fmt](queryset)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+async def aiterate(iterator):
+    # Под ASGI синхронный итератор StreamingHttpResponse собрал бы целиком в память
+    sentinel = object()
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(iterator, sentinel)) is not sentinel:
+        yield chunk
@@ -2,7 +2,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
 from .models import CustomUser, DesignRequest, DesignCategory
-import os
+from .categories import CategoryChoiceField
+from .images import ingest_image
 import re
 
 
@@ -75,24 +76,18 @@ class DesignRequestForm(forms.ModelForm):
     def clean_image(self):
         image = self.cleaned_data.get('image')
         if image:
-            if image.size > 2 * 1024 * 1024:
-                raise ValidationError('Максимальный размер файла 2 МБ')
-
-            valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
-            ext = os.path.splitext(image.name)[1].lower()
-            if ext not in valid_extensions:
-                raise ValidationError('Неподдерживаемый формат изображения')
-
+            image = ingest_image(image)
         return image
 
     class Meta:
         model = DesignRequest
         fields = ['title', 'description', 'category', 'image']
+        field_classes = {'category': CategoryChoiceField}
         help_texts = {
             'title': 'Краткое описание заявки',
             'description': 'Подробное описание помещения и ваших пожеланий',
             'category': 'Выберите подходящую категорию дизайна',
-            'image': 'Форматы: JPG, JPEG, PNG, BMP. Максимальный размер: 2 МБ',
+            'image': 'Форматы: JPG, JPEG, PNG, BMP. Большие изображения будут уменьшены автоматически',
         }
 
 
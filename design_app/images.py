@@ -0,0 +1,140 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTHS = (200, 400, 800)
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_EXTENSION = '.webp'
+THUMBNAIL_QUALITY = 80
+
+ALLOWED_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'BMP': '.bmp'}
+MAX_UPLOAD_SIZE = 25 * 1024 * 1024
+MAX_SOURCE_PIXELS = 60_000_000
+# draft() уменьшает при декодировании только JPEG: PNG и BMP раскрываются в память целиком
+# (до 4 байт на пиксель), поэтому для них предел ниже
+MAX_DECODED_PIXELS = 16_000_000
+MAX_DIMENSION = 2560
+JPEG_QUALITY = 85
+
+
+def thumbnail_name(name, width):
+    root, _ = os.path.splitext(name)
+    return f'{root}.{width}w{THUMBNAIL_EXTENSION}'
+
+
+def thumbnail_names(name, widths=THUMBNAIL_WIDTHS):
+    return [thumbnail_name(name, width) for width in widths]
+
+
+def _render_thumbnail(image, width):
+    thumbnail = image.copy()
+    thumbnail.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    thumbnail.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY, method=4)
+    return ContentFile(buffer.getvalue())
+
+
+def derivative_storage(storage):
+    return getattr(storage, 'derivative_storage', storage)
+
+
+def generate_thumbnails(storage, name, widths=THUMBNAIL_WIDTHS):
+    if not name:
+        return []
+    target_storage = derivative_storage(storage)
+
+    with storage.open(name, 'rb') as source, Image.open(source) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе, не поднимая полный битмап
+        image.draft('RGB', (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        created = []
+        for width in widths:
+            target = thumbnail_name(name, width)
+            if target_storage.exists(target):
+                target_storage.delete(target)
+            created.append(target_storage.save(target, _render_thumbnail(image, width)))
+    return created
+
+
+def ensure_thumbnails(storage, name):
+    if not name:
+        return []
+    if all(derivative_storage(storage).exists(target) for target in thumbnail_names(name)):
+        # Одинаковое содержимое хранится под одним именем, миниатюры уже есть
+        return []
+    try:
+        return generate_thumbnails(storage, name)
+    except (OSError, Image.DecompressionBombError):
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return []
+
+
+def generate_field_thumbnails(field_file):
+    if not field_file:
+        return []
+    return ensure_thumbnails(field_file.storage, field_file.name)
+
+
+def delete_thumbnails(storage, name):
+    storage = derivative_storage(storage)
+    for target in thumbnail_names(name):
+        if storage.exists(target):
+            storage.delete(target)
+
+
+def _reencode(image, name):
+    if image.format == 'JPEG':
+        fmt, extension, options = 'JPEG', '.jpg', {'quality': JPEG_QUALITY, 'optimize': True}
+    else:
+        fmt, extension, options = 'PNG', '.png', {'optimize': True}
+
+    # draft() уменьшает JPEG ещё при декодировании (в 2-8 раз), reduce() — остальные форматы
+    image.draft('RGB', (MAX_DIMENSION, MAX_DIMENSION))
+    factor = max(image.size) // MAX_DIMENSION
+    if factor > 1:
+        image = image.reduce(factor)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    root, _ = os.path.splitext(os.path.basename(name))
+    return SimpleUploadedFile(root + extension, buffer.getvalue(), content_type=Image.MIME[fmt])
+
+
+def ingest_image(uploaded):
+    if uploaded.size > MAX_UPLOAD_SIZE:
+        raise ValidationError(f'Максимальный размер файла {MAX_UPLOAD_SIZE // (1024 * 1024)} МБ')
+
+    uploaded.seek(0)
+    try:
+        # Image.open читает только заголовок: формат и размеры известны без декодирования
+        with Image.open(uploaded) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise ValidationError('Неподдерживаемый формат изображения')
+            width, height = image.size
+            if width * height > (MAX_SOURCE_PIXELS if image.format == 'JPEG' else MAX_DECODED_PIXELS):
+                raise ValidationError('Слишком большое разрешение изображения')
+            if max(width, height) > MAX_DIMENSION:
+                return _reencode(image, uploaded.name)
+            extension = ALLOWED_FORMATS[image.format]
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValidationError('Файл не является изображением')
+
+    root, ext = os.path.splitext(uploaded.name)
+    if ext.lower() != extension and (ext.lower(), extension) != ('.jpeg', '.jpg'):
+        uploaded.name = root + extension
+    uploaded.seek(0)
+    return uploaded
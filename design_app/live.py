@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+
+from .cache import aget_categories_version, aget_requests_version
+from .counters import aget_counters
+from .models import DesignRequest
+
+NEW_REQUESTS_LIMIT = 20
+RETRY_MILLISECONDS = 3000
+
+
+def format_event(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False))
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _versions():
+    return await aget_requests_version(), await aget_categories_version()
+
+
+async def _new_requests(after_id):
+    rows = DesignRequest.objects.filter(id__gt=after_id).order_by('id').values(
+        'id', 'title', 'created_at', 'category__name', 'user__fio',
+    )[:NEW_REQUESTS_LIMIT]
+    return [row async for row in rows]
+
+
+async def event_stream(last_event_id=None, duration=None, retry=RETRY_MILLISECONDS):
+    poll = getattr(settings, 'LIVE_EVENTS_POLL_SECONDS', 1)
+    resync = getattr(settings, 'LIVE_EVENTS_RESYNC_SECONDS', 15)
+    heartbeat = getattr(settings, 'LIVE_EVENTS_HEARTBEAT_SECONDS', 15)
+    if duration is None:
+        duration = getattr(settings, 'LIVE_EVENTS_STREAM_SECONDS', 300)
+
+    counters = await aget_counters()
+    if last_event_id is None:
+        last_id = (await DesignRequest.objects.aaggregate(last=Max('id')))['last'] or 0
+    else:
+        last_id = last_event_id
+    versions = await _versions()
+
+    # Сначала полный снимок: между рендерингом страницы и подключением счётчики могли измениться
+    chunks = [f'retry: {retry}\n\n', format_event('counters', {'counters': counters, 'delta': {}}, last_id)]
+    if last_event_id is not None:
+        # Переподключение: досылаем заявки, созданные, пока соединения не было
+        for row in await _new_requests(last_id):
+            last_id = row['id']
+            chunks.append(format_event('request', row, last_id))
+    yield ''.join(chunks)
+
+    started = checked = sent = time.monotonic()
+    while time.monotonic() - started < duration:
+        await asyncio.sleep(poll)
+        now = time.monotonic()
+        current = await _versions()
+        # Версии в кэше меняются при каждой записи; с LocMemCache изменения из других процессов
+        # видны только при периодической сверке со счётчиками раз в resync секунд
+        if current == versions and now - checked < resync:
+            if now - sent >= heartbeat:
+                sent = now
+                yield ': ping\n\n'
+            continue
+        versions, checked = current, now
+
+        fresh = await aget_counters()
+        delta = {name: value - counters.get(name, 0) for name, value in fresh.items() if value != counters.get(name, 0)}
+        if not delta:
+            continue
+        counters = fresh
+        chunks = [format_event('counters', {'counters': counters, 'delta': delta}, last_id)]
+        if delta.get('total', 0) > 0 or delta.get('new', 0) > 0:
+            for row in await _new_requests(last_id):
+                last_id = row['id']
+                chunks.append(format_event('request', row, last_id))
+        sent = now
+        yield ''.join(chunks)
+
+
+async def live_response(request):
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+    if isinstance(request, ASGIRequest):
+        stream = event_stream(last_event_id)
+    else:
+        # Под WSGI бесконечный поток занял бы поток воркера: отдаём только снимок,
+        # а EventSource переподключается через retry, как при опросе. Интервал длиннее, чем под ASGI:
+        # каждое переподключение — это запрос к воркеру и чтение счётчиков
+        retry = getattr(settings, 'LIVE_EVENTS_WSGI_RETRY_SECONDS', 30) * 1000
+        stream = [chunk async for chunk in event_stream(last_event_id, duration=0, retry=retry)]
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
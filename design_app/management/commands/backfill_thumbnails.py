@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from design_app.images import generate_thumbnails, thumbnail_names
+from design_app.models import DesignRequest
+
+IMAGE_FIELDS = ('image', 'design_image')
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для уже загруженных изображений заявок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать существующие миниатюры')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        storages = [DesignRequest._meta.get_field(field).storage for field in IMAGE_FIELDS]
+        rows = DesignRequest.objects.values_list(*IMAGE_FIELDS).iterator(chunk_size=options['chunk_size'])
+
+        created = failed = 0
+        for names in rows:
+            for storage, name in zip(storages, names):
+                if not name:
+                    continue
+                if not options['force'] and all(storage.exists(t) for t in thumbnail_names(name)):
+                    continue
+                try:
+                    generate_thumbnails(storage, name)
+                    created += 1
+                except (OSError, Image.DecompressionBombError) as e:
+                    failed += 1
+                    self.stderr.write(f'{name}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {created}, ошибок: {failed}'))
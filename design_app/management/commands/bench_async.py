@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+
+from design_app.benchmarking import Timer, benchmark_environment, build_urlconf, percentile
+from design_app.models import CustomUser, DesignCategory, DesignRequest
+
+READ_URLS = [
+    ('/', None),
+    ('/profile/', 'client'),
+    ('/manager/dashboard/', 'staff'),
+    ('/manager/requests/', 'staff'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность синхронных и асинхронных view под AsyncClient'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на каждый URL')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--rows', type=int, default=200, help='Заявок в тестовой БД')
+
+    def handle(self, *args, **options):
+        with benchmark_environment():
+            users = self.seed(options['rows'])
+            report = {}
+            for mode, use_async in (('sync', False), ('async', True)):
+                with override_settings(ROOT_URLCONF=build_urlconf(use_async)):
+                    report[mode] = asyncio.run(self.run_mode(users, options))
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+
+    def seed(self, rows):
+        staff = CustomUser.objects.create_user('bench-staff', 'staff@example.com', 'password', fio='Менеджер', is_staff=True)
+        client = CustomUser.objects.create_user('bench-client', 'client@example.com', 'password', fio='Клиент')
+        category = DesignCategory.objects.create(name='Гостиная')
+        statuses = [status for status, _ in DesignRequest.STATUS_CHOICES]
+        DesignRequest.objects.bulk_create([
+            DesignRequest(
+                user=client, category=category, title=f'Заявка {i}', description='Описание',
+                image='request_images/bench.jpg', status=statuses[i % len(statuses)],
+            )
+            for i in range(rows)
+        ])
+        return {'staff': staff, 'client': client}
+
+    async def run_mode(self, users, options):
+        clients = {None: AsyncClient()}
+        for role, user in users.items():
+            clients[role] = AsyncClient()
+            await clients[role].aforce_login(user)
+
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+
+        async def fetch(url, role):
+            async with semaphore:
+                with Timer() as timer:
+                    response = await clients[role].get(url)
+                assert response.status_code == 200, (url, response.status_code)
+                latencies.append(timer.elapsed)
+
+        jobs = [(url, role) for url, role in READ_URLS for _ in range(options['requests'])]
+        with Timer() as total:
+            await asyncio.gather(*(fetch(url, role) for url, role in jobs))
+
+        return {
+            'requests': len(jobs),
+            'seconds': round(total.elapsed, 3),
+            'requests_per_second': round(len(jobs) / total.elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        }
@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from design_app.db import apply_sqlite_pragmas
+
+PROFILES = {
+    # Поведение до настройки: журнал отката, отложенные транзакции, таймаут по умолчанию
+    'default': {'pragmas': {}, 'begin': 'BEGIN', 'timeout': 5},
+    'tuned': {'pragmas': None, 'begin': 'BEGIN IMMEDIATE', 'timeout': 20},
+}
+
+
+class Command(BaseCommand):
+    help = 'Измеряет пропускную способность чтения и записи SQLite до и после настройки соединения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--rows', type=int, default=20000, help='Строк в таблице перед началом')
+
+    def handle(self, *args, **options):
+        report = {}
+        for name, profile in PROFILES.items():
+            pragmas = settings.SQLITE_PRAGMAS if profile['pragmas'] is None else profile['pragmas']
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                report[name] = self.run_profile(path, pragmas, profile, options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def connect(self, path, pragmas, profile):
+        connection = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+        apply_sqlite_pragmas(connection.cursor(), pragmas)
+        return connection
+
+    def run_profile(self, path, pragmas, profile, options):
+        setup = self.connect(path, pragmas, profile)
+        setup.execute('CREATE TABLE request (id INTEGER PRIMARY KEY, status TEXT, created_at REAL, title TEXT)')
+        setup.execute('CREATE INDEX request_status_created ON request (status, created_at DESC)')
+        setup.execute('BEGIN')
+        setup.executemany(
+            'INSERT INTO request (status, created_at, title) VALUES (?, ?, ?)',
+            ((('new', 'accepted', 'completed')[i % 3], i, f'Заявка {i}') for i in range(options['rows'])),
+        )
+        setup.execute('COMMIT')
+        setup.close()
+
+        stop = threading.Event()
+        results = {'reads': 0, 'writes': 0, 'locked_errors': 0}
+        lock = threading.Lock()
+
+        def count(key):
+            with lock:
+                results[key] += 1
+
+        def reader():
+            connection = self.connect(path, pragmas, profile)
+            while not stop.is_set():
+                try:
+                    connection.execute(
+                        "SELECT id, title FROM request WHERE status = 'completed' ORDER BY created_at DESC LIMIT 25"
+                    ).fetchall()
+                    connection.execute("SELECT count(*) FROM request WHERE status = 'accepted'").fetchone()
+                    count('reads')
+                except sqlite3.OperationalError:
+                    count('locked_errors')
+            connection.close()
+
+        def writer():
+            connection = self.connect(path, pragmas, profile)
+            while not stop.is_set():
+                try:
+                    connection.execute(profile['begin'])
+                    connection.execute(
+                        "INSERT INTO request (status, created_at, title) VALUES ('new', ?, 'Новая')", (time.time(),)
+                    )
+                    connection.execute(
+                        "UPDATE request SET status = 'accepted' WHERE id = (SELECT max(id) FROM request WHERE status = 'new')"
+                    )
+                    connection.execute('COMMIT')
+                    count('writes')
+                except sqlite3.OperationalError:
+                    count('locked_errors')
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+            connection.close()
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer) for _ in range(options['writers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'pragmas': pragmas,
+            'reads_per_second': round(results['reads'] / elapsed, 1),
+            'writes_per_second': round(results['writes'] / elapsed, 1),
+            'locked_errors': results['locked_errors'],
+        }
@@ -0,0 +1,306 @@
+import json
+import random
+import tempfile
+from collections import Counter
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image, ImageDraw
+
+from design_app.benchmarking import Timer, benchmark_environment, percentile, read_body
+from design_app.counters import rebuild_counters
+from design_app.images import generate_thumbnails
+from design_app.models import CustomUser, DesignCategory, DesignRequest, MediaBlob
+from design_app.pagination import PAGE_SIZE, keyset_page
+from design_app.rollups import rebuild_rollups
+from design_app.storage import media_storage
+from design_app.urls import urlpatterns
+
+PASSWORD = 'bench-password'
+BULK_SIZE = 25
+IMAGE_SIZE = (1600, 1200)
+STATUSES = [status for status, _ in DesignRequest.STATUS_CHOICES]
+ROLES = (None, 'client', 'staff')
+
+
+def render_image(seed, size=IMAGE_SIZE):
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle(
+            (x, y, x + rng.randrange(50, 400), y + rng.randrange(50, 400)),
+            fill=tuple(rng.randrange(256) for _ in range(3)),
+        )
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def letters(number):
+    # Логин может содержать только латинские буквы и дефис
+    return ''.join(chr(ord('a') + int(digit)) for digit in str(number))
+
+
+class Command(BaseCommand):
+    help = 'Заполняет тестовую БД синтетическими данными и замеряет все маршруты design_app (JSON-отчёт)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Клиентов в тестовой БД')
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--rows', type=int, default=2000, help='Заявок в тестовой БД')
+        parser.add_argument('--images', type=int, default=8, help='Разных изображений для заявок')
+        parser.add_argument('--iterations', type=int, default=20, help='Замеров на каждый сценарий')
+        parser.add_argument('--warmup', type=int, default=2, help='Прогонов без замера перед каждым сценарием')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта (по умолчанию stdout)')
+        parser.add_argument('--baseline', help='Сохранённый отчёт для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Допустимый рост p50 относительно базового отчёта')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        runs = options['iterations'] + options['warmup']
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with benchmark_environment():
+                with Timer() as seeding:
+                    self.seed(options, reserve=runs * (3 + BULK_SIZE))
+                results = {}
+                for scenario in self.scenarios():
+                    key, results[key] = self.run_scenario(scenario, runs)
+
+        report = {
+            'settings': {
+                name: options[name] for name in ('users', 'categories', 'rows', 'images', 'iterations', 'warmup', 'seed')
+            },
+            'seed_seconds': round(seeding.elapsed, 3),
+            'scenarios': results,
+        }
+        uncovered = {pattern.name for pattern in urlpatterns} - {result['url_name'] for result in results.values()}
+        if uncovered:
+            raise CommandError(f'Нет сценариев для маршрутов: {", ".join(sorted(uncovered))}')
+
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            report['comparison'], regressions = self.compare(results, baseline.get('scenarios', {}))
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        for regression in regressions:
+            self.stderr.write(f'Регрессия: {regression}')
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+
+    def seed(self, options, reserve):
+        storage = media_storage()
+        images = []
+        for index in range(max(1, options['images'])):
+            name = storage.save(f'request_images/bench-{index}.jpg', ContentFile(render_image(index)))
+            generate_thumbnails(storage, name)
+            images.append(name)
+
+        password = make_password(PASSWORD)
+        self.staff = CustomUser.objects.create(
+            username='bench-staff', email='staff@example.com', fio='Менеджер', is_staff=True, password=password,
+        )
+        clients = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench-client-{letters(i)}', email=f'client{i}@example.com', fio='Клиент', password=password)
+            for i in range(max(1, options['users']))
+        ])
+        self.client_user = clients[0]
+        # Заявки, которые сценарии удаляют и переводят в работу, чтобы не трогать основной объём
+        self.owner = CustomUser.objects.create(
+            username='bench-owner', email='owner@example.com', fio='Владелец', password=password,
+        )
+        categories = DesignCategory.objects.bulk_create([
+            DesignCategory(name=f'Категория {i}') for i in range(max(1, options['categories']))
+        ])
+
+        references = Counter()
+
+        def build(user, status, index):
+            image = self.rng.choice(images)
+            references[image] += 1
+            design_image = ''
+            if status == 'completed':
+                design_image = self.rng.choice(images)
+                references[design_image] += 1
+            return DesignRequest(
+                user=user, category=self.rng.choice(categories), title=f'Заявка {index}',
+                description=f'Описание дизайна комнаты {index}', image=image, design_image=design_image,
+                status=status, admin_comment='' if status == 'new' else 'Комментарий менеджера',
+            )
+
+        DesignRequest.objects.bulk_create(
+            (build(self.rng.choice(clients), self.rng.choice(STATUSES), i) for i in range(options['rows'])),
+            batch_size=500,
+        )
+        DesignRequest.objects.bulk_create(
+            (build(self.owner, 'new', options['rows'] + i) for i in range(reserve)),
+            batch_size=500,
+        )
+        # bulk_create не вызывает сигналы: выравниваем ссылки на файлы, счётчики и сводки
+        for name, count in references.items():
+            MediaBlob.objects.filter(name=name).update(refcount=count)
+        rebuild_counters()
+        rebuild_rollups()
+
+        self.reserved = list(DesignRequest.objects.filter(user=self.owner).values_list('id', flat=True))
+        _, self.second_page = keyset_page(DesignRequest.objects.all(), None, PAGE_SIZE)
+
+    def take(self, count=1):
+        if len(self.reserved) < count:
+            raise CommandError('Не хватило зарезервированных заявок для сценариев записи')
+        taken, self.reserved = self.reserved[:count], self.reserved[count:]
+        return taken
+
+    def upload(self, name):
+        return SimpleUploadedFile(name, render_image(self.rng.random()), content_type='image/jpeg')
+
+    def scenarios(self):
+        def get(url_name, roles=ROLES, label='', query='', fresh_client=False, **kwargs):
+            for role in roles:
+                yield {
+                    'url_name': url_name, 'method': 'GET', 'role': role, 'label': label,
+                    'prepare': lambda i, url=reverse(f'design_app:{url_name}', kwargs=kwargs) + query: (url, None),
+                    'fresh_client': fresh_client,
+                }
+
+        def post(url_name, role, prepare, label='', fresh_client=False):
+            yield {
+                'url_name': url_name, 'method': 'POST', 'role': role, 'label': label,
+                'prepare': prepare, 'fresh_client': fresh_client,
+            }
+
+        def url(url_name, **kwargs):
+            return reverse(f'design_app:{url_name}', kwargs=kwargs)
+
+        sample = DesignRequest.objects.filter(status='new').exclude(user=self.owner).first()
+
+        yield from get('index')
+        yield from get('register')
+        yield from post('register', None, lambda i: (url('register'), {
+            'fio': 'Новый Клиент', 'username': f'bench-new-{letters(i)}', 'email': f'new{i}@example.com',
+            'password1': PASSWORD, 'password2': PASSWORD, 'agree_to_terms': 'on',
+        }), fresh_client=True)
+        yield from get('login')
+        yield from post('login', None, lambda i: (url('login'), {
+            'username': self.client_user.username, 'password': PASSWORD,
+        }), fresh_client=True)
+        yield from get('logout', roles=('client',), fresh_client=True)
+        yield from get('profile')
+        yield from get('create_request')
+        yield from post('create_request', 'client', lambda i: (url('create_request'), {
+            'title': f'Новая заявка {i}', 'description': 'Описание',
+            'category': sample.category_id, 'image': self.upload(f'new-{i}.jpg'),
+        }))
+        yield from post('delete_request', 'owner', lambda i: (url('delete_request', request_id=self.take()[0]), {}))
+        yield from get('admin_dashboard')
+        yield from get('analytics')
+        yield from get('analytics', roles=('staff',), label='year', query='?days=365')
+        yield from get('admin_requests')
+        yield from get('admin_requests', roles=('staff',), label='status', query='?status=new')
+        yield from get('admin_requests', roles=('staff',), label='page2', query=f'?after={self.second_page}')
+        yield from get('admin_requests', roles=('staff',), label='search', query='?q=Заявка')
+        yield from get('export_requests', fmt='csv')
+        yield from get('export_requests', roles=('staff',), label='ndjson', fmt='ndjson')
+        yield from get('change_status', roles=('client', 'staff'), request_id=sample.id)
+        yield from post('change_status', 'staff', lambda i: (url('change_status', request_id=self.take()[0]), {
+            'status': 'accepted', 'admin_comment': 'В работе',
+        }))
+        yield from post('bulk_change_status', 'staff', lambda i: (url('bulk_change_status'), {
+            'ids': self.take(BULK_SIZE), 'status': 'accepted', 'admin_comment': 'В работе',
+        }))
+        yield from get('manage_categories')
+        yield from post('manage_categories', 'staff', lambda i: (url('manage_categories'), {
+            'add_category': '1', 'name': f'Новая категория {i}',
+        }))
+        yield from get('admin_delete_request', roles=('client', 'staff'), request_id=sample.id)
+        yield from post('admin_delete_request', 'staff', lambda i: (url('admin_delete_request', request_id=self.take()[0]), {}))
+        yield from get('metrics')
+        yield from get('live_events')
+
+    def make_client(self, role):
+        client = Client()
+        user = {'client': self.client_user, 'staff': self.staff, 'owner': self.owner}.get(role)
+        if user is not None:
+            client.force_login(user)
+        return client
+
+    def run_scenario(self, scenario, runs):
+        role = scenario['role']
+        # Вход, выход и регистрация меняют сессию, поэтому для них клиент создаётся заново
+        fresh_client = scenario['fresh_client']
+        client = None if fresh_client else self.make_client(role)
+        method = scenario['method'].lower()
+
+        latencies, queries, sizes, statuses = [], [], [], Counter()
+        streaming = False
+        for i in range(runs):
+            url, data = scenario['prepare'](i)
+            if fresh_client:
+                client = self.make_client(role)
+            with CaptureQueriesContext(connection) as captured, Timer() as timer:
+                response = getattr(client, method)(url, data) if data is not None else getattr(client, method)(url)
+                size = read_body(response)
+            streaming = response.streaming
+            if i < self.options['warmup']:
+                continue
+            latencies.append(timer.elapsed)
+            queries.append(len(captured))
+            sizes.append(size)
+            statuses[response.status_code] += 1
+
+        key = ' '.join(filter(None, [scenario['url_name'], scenario['label'], scenario['method'], role or 'anonymous']))
+        return key, {
+            'url_name': scenario['url_name'],
+            'method': scenario['method'],
+            'role': role or 'anonymous',
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 0.9) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'max_ms': round(max(latencies, default=0) * 1000, 2),
+            'queries': max(queries, default=0),
+            'bytes': max(sizes, default=0),
+            'streaming': streaming,
+        }
+
+    def compare(self, results, baseline):
+        comparison, regressions = {}, []
+        tolerance = self.options['tolerance']
+        for key, result in results.items():
+            previous = baseline.get(key)
+            if previous is None:
+                continue
+            if result.get('streaming') and 'bytes' not in previous:
+                # Базовый отчёт снят без чтения тела потоковых ответов: его время с текущим не сравнимо
+                comparison[key] = {'p50_ratio': None, 'queries_delta': None}
+                continue
+            ratio = result['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else 1.0
+            comparison[key] = {
+                'p50_ratio': round(ratio, 3),
+                'queries_delta': result['queries'] - previous['queries'],
+            }
+            if ratio > 1 + tolerance:
+                regressions.append(f'{key}: p50 {previous["p50_ms"]} → {result["p50_ms"]} мс')
+            if result['queries'] > previous['queries']:
+                regressions.append(f'{key}: запросов {previous["queries"]} → {result["queries"]}')
+        return comparison, regressions
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from design_app.deletion import DELETE_CHUNK_SIZE, purge_pending_categories
+
+
+class Command(BaseCommand):
+    help = 'Удаляет категории, помеченные на удаление, вместе с их заявками — порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DELETE_CHUNK_SIZE)
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между порциями, с')
+
+    def handle(self, *args, **options):
+        purged = purge_pending_categories(options['chunk_size'], options['pause'])
+        for name, deleted in purged.items():
+            self.stdout.write(f'{name}: удалено заявок {deleted}')
+        self.stdout.write(self.style.SUCCESS(f'Удалено категорий: {len(purged)}'))
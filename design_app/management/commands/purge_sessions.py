@@ -0,0 +1,29 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+# Встроенный clearsessions удаляет все просроченные сессии одним DELETE: на SQLite вся запись в базу
+# ждёт, пока он не закончит. Здесь сессии удаляются пакетами, каждый в своей короткой транзакции,
+# с паузой между ними. Запускать по расписанию вместо clearsessions (например, раз в час из cron).
+class Command(BaseCommand):
+    help = 'Удаляет просроченные сессии небольшими пакетами, не блокируя базу надолго (замена clearsessions)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между пакетами, с')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now).order_by('expire_date')
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Удалено просроченных сессий: {deleted}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from design_app.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики заявок одним агрегирующим запросом'
+
+    def handle(self, *args, **options):
+        values = rebuild_counters()
+        for name, value in values.items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
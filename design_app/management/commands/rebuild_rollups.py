@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from design_app.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные сводки заявок одним агрегирующим запросом'
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Сводки пересчитаны, строк: {rows}'))
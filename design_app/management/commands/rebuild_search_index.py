@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from design_app.search import rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс FTS5 по заявкам'
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('Полнотекстовый поиск доступен только для SQLite')
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано заявок: {count}'))
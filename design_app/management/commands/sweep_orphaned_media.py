@@ -0,0 +1,124 @@
+import glob
+import os
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from design_app.images import THUMBNAIL_EXTENSION, delete_thumbnails, derivative_storage
+from design_app.models import DesignRequest, MediaBlob
+from design_app.routers import use_primary
+
+IMAGE_FIELDS = ('image', 'design_image')
+THUMBNAIL_RE = re.compile(r'\.\d+w' + re.escape(THUMBNAIL_EXTENSION) + '$')
+
+
+def scan(directory, prefix):
+    # os.scandir отдаёт записи по одной: список файлов целиком в памяти не держим
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            name = f'{prefix}/{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan(entry.path, name)
+            elif entry.is_file(follow_symlinks=False):
+                try:
+                    yield name, entry.stat().st_mtime
+                except FileNotFoundError:
+                    # Миниатюру уже удалили вместе с её исходником
+                    continue
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из MEDIA_ROOT изображения заявок и миниатюры, на которые не ссылается ни одна заявка'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--grace-hours', type=float, default=1.0,
+            help='Не трогать файлы моложе этого возраста: загрузка могла ещё не сохранить заявку',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        fields = [DesignRequest._meta.get_field(field) for field in IMAGE_FIELDS]
+        storage = fields[0].storage
+        self.files = derivative_storage(storage)
+        self.storage = storage
+        self.dry_run = options['dry_run']
+        cutoff = time.time() - options['grace_hours'] * 3600
+
+        directories = sorted({field.upload_to.strip('/') for field in fields})
+        with use_primary():
+            removed, checked = self.sweep(storage, directories, cutoff, options['batch_size'])
+
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'Проверено файлов: {checked}. {verb}: {removed}'))
+
+    def sweep(self, storage, directories, cutoff, batch_size):
+        removed = checked = 0
+        for directory in directories:
+            files = scan(os.path.join(storage.location, directory), directory)
+            for batch in batched(files, batch_size):
+                checked += len(batch)
+                old = [name for name, mtime in batch if mtime < cutoff]
+                originals = [name for name in old if not THUMBNAIL_RE.search(name)]
+                thumbnails = [name for name in old if THUMBNAIL_RE.search(name)]
+                removed += self.remove_originals(self.unreferenced(originals))
+                removed += self.remove_thumbnails(thumbnails)
+        return removed, checked
+
+    def unreferenced(self, names):
+        referenced = set()
+        for field in IMAGE_FIELDS:
+            # По индексам request_image_idx / request_design_image_idx
+            referenced.update(
+                DesignRequest.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True)
+            )
+        return [name for name in names if name not in referenced]
+
+    def remove_originals(self, names):
+        for name in names:
+            self.stdout.write(name)
+            if self.dry_run:
+                continue
+            with transaction.atomic():
+                MediaBlob.objects.filter(name=name).delete()
+                transaction.on_commit(lambda name=name: self.delete_file(name))
+        return len(names)
+
+    def delete_file(self, name):
+        self.files.delete(name)
+        delete_thumbnails(self.storage, name)
+
+    def remove_thumbnails(self, names):
+        removed = 0
+        for name in names:
+            root = THUMBNAIL_RE.sub('', name)
+            sources = [
+                path for path in glob.glob(glob.escape(self.files.path(root)) + '.*')
+                if not THUMBNAIL_RE.search(path)
+            ]
+            if sources or not self.files.exists(name):
+                continue
+            # Исходник уже удалён, миниатюра осталась
+            self.stdout.write(name)
+            if not self.dry_run:
+                self.files.delete(name)
+            removed += 1
+        return removed
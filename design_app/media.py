@@ -0,0 +1,126 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CONTENT_ADDRESSED_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}[^/]*$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _cache_control(path):
+    if CONTENT_ADDRESSED_RE.search(path):
+        # Имя файла — хэш содержимого, файл под этим именем никогда не меняется
+        max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 60 * 60 * 24 * 365)
+        return f'public, max-age={max_age}, immutable'
+    # Под старым именем может оказаться другой файл: после max-age браузер сверяет ETag (304)
+    max_age = getattr(settings, 'MEDIA_MUTABLE_CACHE_MAX_AGE', 60)
+    return f'public, max-age={max_age}, must-revalidate'
+
+
+def _parse_range(header, size):
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        length = min(int(end), size)
+        if length == 0:
+            raise ValueError(header)
+        return size - length, size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload_response(path, content_type):
+    offload = getattr(settings, 'MEDIA_OFFLOAD', None)
+    response = HttpResponse(content_type=content_type)
+    if offload == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + path.lstrip('/')
+    else:
+        response['X-Sendfile'] = safe_join(settings.MEDIA_ROOT, path)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Файл не найден')
+
+    size = stat_result.st_size
+    etag = f'"{size:x}-{stat_result.st_mtime_ns:x}"'
+    last_modified = int(stat_result.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _build_response(request, path, full_path, size, etag, last_modified, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = _cache_control(path)
+    response['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def _build_response(request, path, full_path, size, etag, last_modified, content_type):
+    if getattr(settings, 'MEDIA_OFFLOAD', None):
+        # Диапазоны и условные запросы обрабатывает фронтенд-сервер
+        return _offload_response(path, content_type)
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        # Файл изменился с момента первой части загрузки — отдаём целиком
+        range_header = None
+
+    if range_header:
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None and byte_range != (0, size - 1):
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            return response
+
+    # FileResponse отдаёт файл через wsgi.file_wrapper: gunicorn/uwsgi используют os.sendfile
+    return FileResponse(open(full_path, 'rb'), content_type=content_type)
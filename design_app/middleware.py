@@ -0,0 +1,184 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import finish_request, registry, start_request
+from .routers import PINNED_BY_COOKIE, pin_to_primary, pinned_to_primary, unpin
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PIN_COOKIE = 'primary_db_pin'
+
+
+class ReplicaPinMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = pin_to_primary(PINNED_BY_COOKIE if REPLICA_PIN_COOKIE in request.COOKIES else False)
+        try:
+            response = self.get_response(request)
+            return self.process_response(request, response)
+        finally:
+            unpin(token)
+
+    async def __acall__(self, request):
+        token = pin_to_primary(PINNED_BY_COOKIE if REPLICA_PIN_COOKIE in request.COOKIES else False)
+        try:
+            response = await self.get_response(request)
+            return self.process_response(request, response)
+        finally:
+            unpin(token)
+
+    def process_response(self, request, response):
+        if pinned_to_primary() is True:
+            # Следующие запросы пользователя (например, после redirect) тоже читают с основной БД;
+            # каждая новая запись продлевает cookie
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(sql):
+    # Параметры уже вынесены в %s; списки IN разной длины считаем одной формой
+    return IN_LIST_RE.sub('IN (%s...)', sql)
+
+
+class QueryInspectionMiddleware:
+    """Считает SQL-запросы на каждый запрос, ищет повторы одной формы (N+1) и проверяет QUERY_BUDGETS.
+
+    Включается настройкой QUERY_INSPECTION; при QUERY_BUDGET_STRICT нарушения поднимают исключение.
+    Запросы учитываются в потоке view, поэтому под ASGI запрос проходит без инспекции:
+    иначе вся цепочка middleware выполнялась бы в потоке.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'QUERY_INSPECTION', False):
+            return self.get_response(request)
+
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(query_shape(sql))
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            response = self.get_response(request)
+
+        response['X-Query-Count'] = str(len(queries))
+        self.check(request, queries)
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def check(self, request, queries):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        problems = []
+
+        threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        for shape, count in Counter(queries).items():
+            if count >= threshold:
+                problems.append(f'{view_name}: запрос повторён {count} раз (N+1): {shape}')
+
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+        if budget is not None and len(queries) > budget:
+            problems.append(f'{view_name}: {len(queries)} запросов при бюджете {budget}')
+
+        for problem in problems:
+            logger.warning(problem)
+        if problems and getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded('\n'.join(problems))
+
+
+METRICS_NAMESPACE = 'design_app'
+
+
+class RequestMetricsMiddleware:
+    """Время запроса, SQL, шаблонов и размер загрузки для view из design_app.urls: заголовок Server-Timing и гистограммы."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.process_response(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.process_response(request, response, metrics)
+
+    def process_response(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+        response['Server-Timing'] = ', '.join([
+            f'app;dur={duration * 1000:.1f}',
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+        ])
+
+        match = request.resolver_match
+        if match is None or METRICS_NAMESPACE not in match.namespaces:
+            return response
+        view = match.view_name
+        registry.observe('design_app_request_duration_seconds', view, duration)
+        registry.observe('design_app_db_duration_seconds', view, metrics.db_time)
+        registry.observe('design_app_db_queries', view, metrics.db_queries)
+        registry.observe('design_app_template_duration_seconds', view, metrics.template_time)
+        if request.method == 'POST':
+            try:
+                upload = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                upload = 0
+            registry.observe('design_app_upload_bytes', view, upload)
+        return response
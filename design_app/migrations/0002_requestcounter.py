@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:07
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    DesignRequest = apps.get_model('design_app', 'DesignRequest')
+    DesignCategory = apps.get_model('design_app', 'DesignCategory')
+    RequestCounter = apps.get_model('design_app', 'RequestCounter')
+
+    values = DesignRequest.objects.aggregate(
+        total=Count('id'),
+        new=Count('id', filter=Q(status='new')),
+        accepted=Count('id', filter=Q(status='accepted')),
+        completed=Count('id', filter=Q(status='completed')),
+    )
+    values['categories'] = DesignCategory.objects.count()
+    RequestCounter.objects.bulk_create(
+        [RequestCounter(name=name, value=value) for name, value in values.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestCounter',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False, verbose_name='Счётчик')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик заявок',
+                'verbose_name_plural': 'Счётчики заявок',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0002_requestcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='designrequest',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='request_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='designrequest',
+            index=models.Index(fields=['-created_at', '-id'], name='request_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='designrequest',
+            index=models.Index(fields=['user', '-created_at'], name='request_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:10
+
+import design_app.storage
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def register_existing_files(apps, schema_editor):
+    DesignRequest = apps.get_model('design_app', 'DesignRequest')
+    MediaBlob = apps.get_model('design_app', 'MediaBlob')
+
+    refcounts = Counter()
+    for names in DesignRequest.objects.values_list('image', 'design_image').iterator():
+        refcounts.update(name for name in names if name)
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refcount=count) for name, count in refcounts.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0003_designrequest_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл медиа',
+                'verbose_name_plural': 'Файлы медиа',
+            },
+        ),
+        migrations.AlterField(
+            model_name='designrequest',
+            name='design_image',
+            field=models.ImageField(blank=True, null=True, storage=design_app.storage.media_storage, upload_to='design_images/', verbose_name='Изображение дизайна'),
+        ),
+        migrations.AlterField(
+            model_name='designrequest',
+            name='image',
+            field=models.ImageField(storage=design_app.storage.media_storage, upload_to='request_images/', verbose_name='Изображение помещения'),
+        ),
+        migrations.RunPython(register_existing_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:16
+
+from django.db import migrations
+
+FTS_TABLE = 'design_app_designrequest_fts'
+
+FTS_ROW = """
+    SELECT r.id, r.title, r.description, c.name, u.fio
+    FROM design_app_designrequest r
+    JOIN design_app_designcategory c ON c.id = r.category_id
+    JOIN design_app_customuser u ON u.id = r.user_id
+"""
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, description, category, fio,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"INSERT INTO {FTS_TABLE}(rowid, title, description, category, fio) {FTS_ROW}",
+    f"""
+    CREATE TRIGGER design_request_fts_insert AFTER INSERT ON design_app_designrequest BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, category, fio) {FTS_ROW} WHERE r.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_request_fts_update AFTER UPDATE ON design_app_designrequest
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description
+        OR old.category_id IS NOT new.category_id OR old.user_id IS NOT new.user_id
+    BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, title, description, category, fio) {FTS_ROW} WHERE r.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_request_fts_delete AFTER DELETE ON design_app_designrequest BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_category_fts_update AFTER UPDATE OF name ON design_app_designcategory
+    WHEN old.name IS NOT new.name
+    BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name
+        WHERE rowid IN (SELECT id FROM design_app_designrequest WHERE category_id = new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_user_fts_update AFTER UPDATE OF fio ON design_app_customuser
+    WHEN old.fio IS NOT new.fio
+    BEGIN
+        UPDATE {FTS_TABLE} SET fio = new.fio
+        WHERE rowid IN (SELECT id FROM design_app_designrequest WHERE user_id = new.id);
+    END
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS design_user_fts_update',
+    'DROP TRIGGER IF EXISTS design_category_fts_update',
+    'DROP TRIGGER IF EXISTS design_request_fts_delete',
+    'DROP TRIGGER IF EXISTS design_request_fts_update',
+    'DROP TRIGGER IF EXISTS design_request_fts_insert',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def create_fts(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других СУБД поиск работает через icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0004_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:27
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import F
+
+fts = import_module('design_app.migrations.0005_designrequest_fts')
+FTS_TABLE, FTS_ROW = fts.FTS_TABLE, fts.FTS_ROW
+
+# Пересоздание таблицы заявок в SQLite (AddField/AlterField) удаляет её триггеры,
+# поэтому такие миграции снимают и заново создают триггеры индекса из 0005
+TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER design_request_fts_insert AFTER INSERT ON design_app_designrequest BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, category, fio) {FTS_ROW} WHERE r.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_request_fts_update AFTER UPDATE ON design_app_designrequest
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description
+        OR old.category_id IS NOT new.category_id OR old.user_id IS NOT new.user_id
+    BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, title, description, category, fio) {FTS_ROW} WHERE r.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_request_fts_delete AFTER DELETE ON design_app_designrequest BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_category_fts_update AFTER UPDATE OF name ON design_app_designcategory
+    WHEN old.name IS NOT new.name
+    BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name
+        WHERE rowid IN (SELECT id FROM design_app_designrequest WHERE category_id = new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER design_user_fts_update AFTER UPDATE OF fio ON design_app_customuser
+    WHEN old.fio IS NOT new.fio
+    BEGIN
+        UPDATE {FTS_TABLE} SET fio = new.fio
+        WHERE rowid IN (SELECT id FROM design_app_designrequest WHERE user_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGERS_SQL = [
+    'DROP TRIGGER IF EXISTS design_user_fts_update',
+    'DROP TRIGGER IF EXISTS design_category_fts_update',
+    'DROP TRIGGER IF EXISTS design_request_fts_delete',
+    'DROP TRIGGER IF EXISTS design_request_fts_update',
+    'DROP TRIGGER IF EXISTS design_request_fts_insert',
+]
+
+
+def drop_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+
+def create_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+
+def fill_updated_at(apps, schema_editor):
+    DesignRequest = apps.get_model('design_app', 'DesignRequest')
+    db_alias = schema_editor.connection.alias
+    DesignRequest.objects.using(db_alias).update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0005_designrequest_fts'),
+    ]
+
+    operations = [
+        # SQLite пересоздаёт таблицу заявок: триггеры полнотекстового индекса снимаем на время
+        migrations.RunPython(drop_fts_triggers, create_fts_triggers),
+        migrations.AddField(
+            model_name='designrequest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(create_fts_triggers, drop_fts_triggers),
+    ]
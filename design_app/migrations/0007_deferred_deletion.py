@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0006_designrequest_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='designcategory',
+            name='deletion_requested_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Удаление запрошено'),
+        ),
+        migrations.AddIndex(
+            model_name='designrequest',
+            index=models.Index(fields=['image'], name='request_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='designrequest',
+            index=models.Index(fields=['design_image'], name='request_design_image_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:32
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+triggers = import_module('design_app.migrations.0006_designrequest_updated_at')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0007_deferred_deletion'),
+    ]
+
+    operations = [
+        # SQLite пересоздаёт таблицу заявок: триггеры полнотекстового индекса снимаем на время
+        migrations.RunPython(triggers.drop_fts_triggers, triggers.create_fts_triggers),
+        migrations.AddField(
+            model_name='designrequest',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Версия'),
+        ),
+        migrations.RunPython(triggers.create_fts_triggers, triggers.drop_fts_triggers),
+    ]
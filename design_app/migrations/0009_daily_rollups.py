@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    DesignRequest = apps.get_model('design_app', 'DesignRequest')
+    DailyRequestRollup = apps.get_model('design_app', 'DailyRequestRollup')
+    db_alias = schema_editor.connection.alias
+
+    rows = DesignRequest.objects.using(db_alias).annotate(day=TruncDate('created_at')).values(
+        'day', 'category_id', 'status',
+    ).annotate(count=Count('id')).order_by()
+    DailyRequestRollup.objects.using(db_alias).bulk_create([
+        DailyRequestRollup(date=row['day'], category_id=row['category_id'], status=row['status'], count=row['count'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('design_app', '0008_designrequest_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRequestRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата создания заявок')),
+                ('status', models.CharField(choices=[('new', 'Новая'), ('accepted', 'Принято в работу'), ('completed', 'Выполнено')], max_length=20, verbose_name='Статус')),
+                ('count', models.IntegerField(default=0, verbose_name='Число заявок')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='design_app.designcategory', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка заявок',
+                'verbose_name_plural': 'Дневные сводки заявок',
+                'constraints': [models.UniqueConstraint(fields=('date', 'category', 'status'), name='daily_rollup_key')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
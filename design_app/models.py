@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import DatabaseError, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 
+from .storage import media_storage
+
+
+class StaleVersionError(DatabaseError):
+    """Заявку изменил или удалил кто-то другой после того, как она была загружена."""
+
 
 class CustomUser(AbstractUser):
     fio = models.CharField(verbose_name='ФИО')
@@ -17,6 +23,8 @@ class CustomUser(AbstractUser):
 
 class DesignCategory(models.Model):
     name = models.CharField(verbose_name='Название категории')
+    # Категория с заявками удаляется в фоне (design_app.deletion); до тех пор она скрыта из списков
+    deletion_requested_at = models.DateTimeField(null=True, blank=True, verbose_name='Удаление запрошено')
 
     def __str__(self):
         return self.name
@@ -48,6 +56,7 @@ class DesignRequest(models.Model):
     )
     image = models.ImageField(
         upload_to='request_images/',
+        storage=media_storage,
         verbose_name='Изображение помещения'
     )
     status = models.CharField(
@@ -57,12 +66,16 @@ class DesignRequest(models.Model):
         verbose_name='Статус заявки'
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+    # Оптимистическая блокировка: каждое изменение увеличивает версию, условные UPDATE сверяют её
+    version = models.PositiveIntegerField(default=1, verbose_name='Версия')
     admin_comment = models.TextField(
         blank=True,
         verbose_name='Комментарий администратора'
     )
     design_image = models.ImageField(
         upload_to='design_images/',
+        storage=media_storage,
         blank=True,
         null=True,
         verbose_name='Изображение дизайна'
@@ -71,20 +84,114 @@ class DesignRequest(models.Model):
     def __str__(self):
         return f"{self.title} - {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус и категория на момент загрузки нужны сигналам для пересчёта счётчиков и сводок
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        instance._loaded_files = {
+            field: getattr(instance.__dict__.get(field), 'name', instance.__dict__.get(field))
+            for field in ('image', 'design_image')
+        }
+        return instance
+
+    # Версия, с которой сверяется UPDATE; None вне save() (loaddata и прочие вызовы save_base)
+    _expected_version = None
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self._expected_version = self.version
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        try:
+            # Ссылки на файлы (MediaBlob) увеличиваются в pre_save: вместе с INSERT/UPDATE или никак
+            with transaction.atomic(savepoint=False):
+                super().save(*args, **kwargs)
+        except StaleVersionError:
+            self.version = self._expected_version
+            raise
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        if self._expected_version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        # UPDATE ... WHERE version = загруженной: иначе save() затёр бы чужую смену статуса.
+        # Удалённую заявку тоже не воссоздаём INSERT'ом, как сделал бы Model.save()
+        base_qs = base_qs.filter(version=self._expected_version)
+        if not super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update):
+            raise StaleVersionError(f'Заявка {pk_val} изменена или удалена другим пользователем')
+        return True
+
     def can_be_deleted(self):
         return self.status == 'new'
 
-    def clean(self):
+    def status_errors(self):
+        errors = {}
         if self.status == 'completed' and not self.design_image:
-            raise ValidationError({
-                'design_image': 'Для статуса "Выполнено" обязательно изображение дизайна'
-            })
+            errors['design_image'] = 'Для статуса "Выполнено" обязательно изображение дизайна'
         if self.status == 'accepted' and not self.admin_comment.strip():
-            raise ValidationError({
-                'admin_comment': 'Для статуса "Принято в работу" обязателен комментарий'
-            })
+            errors['admin_comment'] = 'Для статуса "Принято в работу" обязателен комментарий'
+        return errors
+
+    def clean(self):
+        errors = self.status_errors()
+        if errors:
+            raise ValidationError(errors)
 
     class Meta:
         verbose_name = 'Заявка на дизайн'
         verbose_name_plural = 'Заявки на дизайн'
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'], name='request_status_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='request_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='request_user_created_idx'),
+            # Поиск ссылок на файл при очистке медиа (sweep_orphaned_media)
+            models.Index(fields=['image'], name='request_image_idx'),
+            models.Index(fields=['design_image'], name='request_design_image_idx'),
+        ]
+
+
+class RequestCounter(models.Model):
+    name = models.CharField(max_length=20, primary_key=True, verbose_name='Счётчик')
+    value = models.BigIntegerField(default=0, verbose_name='Значение')
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    class Meta:
+        verbose_name = 'Счётчик заявок'
+        verbose_name_plural = 'Счётчики заявок'
+
+
+class DailyRequestRollup(models.Model):
+    # Число заявок, созданных в этот день в этой категории и находящихся сейчас в этом статусе
+    date = models.DateField(verbose_name='Дата создания заявок')
+    category = models.ForeignKey(DesignCategory, on_delete=models.CASCADE, verbose_name='Категория')
+    status = models.CharField(max_length=20, choices=DesignRequest.STATUS_CHOICES, verbose_name='Статус')
+    count = models.IntegerField(default=0, verbose_name='Число заявок')
+
+    def __str__(self):
+        return f"{self.date} {self.category_id} {self.status}: {self.count}"
+
+    class Meta:
+        verbose_name = 'Дневная сводка заявок'
+        verbose_name_plural = 'Дневные сводки заявок'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category', 'status'], name='daily_rollup_key'),
+        ]
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, primary_key=True, verbose_name='Файл')
+    refcount = models.PositiveIntegerField(default=0, verbose_name='Число ссылок')
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+    class Meta:
+        verbose_name = 'Файл медиа'
+        verbose_name_plural = 'Файлы медиа'
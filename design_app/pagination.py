@@ -0,0 +1,67 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+PAGE_SIZE = 25
+
+
+def encode_cursor(design_request):
+    raw = f'{design_request.created_at.isoformat()}|{design_request.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_queryset(queryset, cursor=None):
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    return queryset
+
+
+def keyset_page(queryset, cursor=None, page_size=PAGE_SIZE):
+    items = list(keyset_queryset(queryset, cursor)[:page_size + 1])
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return items[:page_size], next_cursor
+
+
+async def akeyset_page(queryset, cursor=None, page_size=PAGE_SIZE):
+    items = [item async for item in keyset_queryset(queryset, cursor)[:page_size + 1]]
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return items[:page_size], next_cursor
+
+
+class BoundedCountPaginator(Paginator):
+    """Paginator для списков админки без точного COUNT(*) по всей таблице.
+
+    Без фильтров берётся unfiltered_count() (например, из счётчиков), иначе считается
+    не больше count_limit строк: дальние страницы всё равно не листают.
+    """
+
+    count_limit = 10000
+
+    def unfiltered_count(self):
+        return None
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            total = self.unfiltered_count()
+            if total is not None:
+                return total
+        return self.object_list.order_by()[:self.count_limit].count()
@@ -0,0 +1,130 @@
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import aversioned, versioned
+from .models import DailyRequestRollup, DesignRequest
+from .routers import use_primary
+
+STATUSES = [status for status, _ in DesignRequest.STATUS_CHOICES]
+ANALYTICS_DAYS = 30
+MAX_ANALYTICS_DAYS = 366
+# Ограничивает размер WHERE ... OR ...: у SQLite есть предел глубины выражения
+ADJUST_BATCH_SIZE = 100
+
+
+def rollup_key(created_at, category_id, status):
+    return timezone.localdate(created_at), category_id, status
+
+
+def status_change_deltas(created_at, category_id, old_status, new_status, count=1):
+    deltas = Counter()
+    if old_status != new_status:
+        deltas[rollup_key(created_at, category_id, old_status)] -= count
+        deltas[rollup_key(created_at, category_id, new_status)] += count
+    return deltas
+
+
+def _key_filter(keys):
+    condition = Q()
+    for day, category_id, status in keys:
+        condition |= Q(date=day, category_id=category_id, status=status)
+    return condition
+
+
+def adjust_rollups(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    keys = list(deltas)
+    # Без точки сохранения: внутри транзакции смены статуса лишние SAVEPOINT не нужны
+    with transaction.atomic(savepoint=False):
+        for start in range(0, len(keys), ADJUST_BATCH_SIZE):
+            batch = keys[start:start + ADJUST_BATCH_SIZE]
+            existing = set(DailyRequestRollup.objects.filter(_key_filter(batch)).values_list('date', 'category_id', 'status'))
+            if existing:
+                # Одним UPDATE для всех строк сводки, как adjust_counters
+                DailyRequestRollup.objects.filter(_key_filter(existing)).update(count=F('count') + Case(
+                    *(When(date=day, category_id=category_id, status=status, then=Value(deltas[day, category_id, status]))
+                      for day, category_id, status in existing),
+                    default=Value(0),
+                ))
+            DailyRequestRollup.objects.bulk_create([
+                DailyRequestRollup(date=day, category_id=category_id, status=status, count=deltas[day, category_id, status])
+                for day, category_id, status in batch
+                # Уменьшать отсутствующую строку незачем: сводка ещё не построена или удаляется с категорией
+                if (day, category_id, status) not in existing and deltas[day, category_id, status] > 0
+            ])
+
+
+def rebuild_rollups():
+    rows = DesignRequest.objects.filter(category__deletion_requested_at__isnull=True).annotate(
+        day=TruncDate('created_at'),
+    ).values('day', 'category_id', 'status').annotate(count=Count('id')).order_by()
+
+    with use_primary(), transaction.atomic():
+        DailyRequestRollup.objects.all().delete()
+        created = DailyRequestRollup.objects.bulk_create([
+            DailyRequestRollup(date=row['day'], category_id=row['category_id'], status=row['status'], count=row['count'])
+            for row in rows.iterator()
+        ], batch_size=1000)
+    return len(created)
+
+
+def parse_days(value):
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return ANALYTICS_DAYS
+    return min(max(days, 1), MAX_ANALYTICS_DAYS)
+
+
+def _with_total(counts):
+    return {**counts, 'total': sum(counts.values())}
+
+
+def analytics(days=ANALYTICS_DAYS, end=None):
+    # Читаются только сводки: стоимость зависит от числа дней и категорий, а не заявок
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = DailyRequestRollup.objects.filter(
+        date__range=(start, end), count__gt=0, category__deletion_requested_at__isnull=True,
+    ).values_list(
+        'date', 'category__name', 'status', 'count',
+    )
+
+    # Одним запросом: строк не больше, чем дней × категорий × статусов
+    daily = {start + timedelta(days=offset): dict.fromkeys(STATUSES, 0) for offset in range(days)}
+    categories = {}
+    totals = dict.fromkeys(STATUSES, 0)
+    for day, category, status, count in rows:
+        daily[day][status] += count
+        categories.setdefault(category, dict.fromkeys(STATUSES, 0))[status] += count
+        totals[status] += count
+
+    return {
+        'start': start,
+        'end': end,
+        'days': days,
+        'totals': _with_total(totals),
+        'daily': [{'date': day, **_with_total(counts)} for day, counts in daily.items()],
+        'categories': sorted(
+            ({'category': name, **_with_total(counts)} for name, counts in categories.items()),
+            key=lambda row: (-row['total'], row['category']),
+        ),
+    }
+
+
+def cached_analytics(days=ANALYTICS_DAYS):
+    end = timezone.localdate()
+    return versioned(f'analytics:{end}:{days}', lambda: analytics(days, end))
+
+
+async def acached_analytics(days=ANALYTICS_DAYS):
+    end = timezone.localdate()
+    return await aversioned(f'analytics:{end}:{days}', lambda: sync_to_async(analytics)(days, end))
@@ -0,0 +1,57 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICATED_MODELS = {'designrequest', 'designcategory'}
+
+_pinned_to_primary = ContextVar('design_app_pinned_to_primary', default=False)
+# Запрос пришёл с cookie недавней записи; True — запись была в этом запросе
+PINNED_BY_COOKIE = 'cookie'
+
+
+def pin_to_primary(pinned=True):
+    return _pinned_to_primary.set(pinned)
+
+
+def unpin(token):
+    _pinned_to_primary.reset(token)
+
+
+def pinned_to_primary():
+    return _pinned_to_primary.get()
+
+
+@contextmanager
+def use_primary():
+    # Для фоновых задач и команд: решения об удалении принимаются по основной БД, а не по отстающей реплике
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        unpin(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'design_app' or model._meta.model_name not in REPLICATED_MODELS:
+            return None
+        # Исторические модели миграций (RunPython) читают ту базу, которую мигрируют, а не реплику
+        if model.__module__ == '__fake__':
+            return None
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or pinned_to_primary():
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, 'DATABASE_REPLICAS', []):
+            return False
+        return None
@@ -0,0 +1,60 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'design_app_designrequest_fts'
+SEARCH_LIMIT = 100
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Веса столбцов для bm25: title, description, category, fio, username
+RANK_SQL = f'bm25({FTS_TABLE}, 10.0, 1.0, 2.0, 3.0, 3.0)'
+
+REBUILD_SQL = [
+    f'DELETE FROM {FTS_TABLE}',
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, description, category, fio, username)
+    SELECT r.id, r.title, r.description, c.name, u.fio, u.username
+    FROM design_app_designrequest r
+    JOIN design_app_designcategory c ON c.id = r.category_id
+    JOIN design_app_customuser u ON u.id = r.user_id
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')",
+]
+
+
+def search_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_match(query):
+    # Каждое слово — префиксный запрос в кавычках, чтобы синтаксис FTS5 в пользовательском вводе не ломал MATCH
+    tokens = TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def matching_ids_sql(query):
+    return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [build_match(query)])
+
+
+def ranked(queryset, query, limit=SEARCH_LIMIT):
+    # Фильтры queryset применяются до LIMIT: иначе лучшие SEARCH_LIMIT совпадений
+    # могли не содержать ни одной заявки с нужным статусом
+    match = build_match(query)
+    if not match:
+        return []
+    table = queryset.model._meta.db_table
+    rank = RawSQL(
+        f'SELECT {RANK_SQL} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+        [match],
+    )
+    return list(queryset.filter(id__in=matching_ids_sql(query)).annotate(rank=rank).order_by('rank', '-id')[:limit])
+
+
+def rebuild_search_index():
+    with transaction.atomic(), connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
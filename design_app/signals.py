@@ -0,0 +1,117 @@
+from collections import Counter
+
+from django.contrib.auth.signals import user_logged_out
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import invalidate_cached_user
+from .cache import bump_categories_version, bump_requests_version, invalidate
+from .counters import adjust_counters
+from .db import configure_connection
+from .deletion import pending_category_ids, purging_category, resume_deletion_worker
+from .images import delete_thumbnails
+from .metrics import install_query_recorder
+from .models import CustomUser, DesignCategory, DesignRequest
+from .rollups import adjust_rollups, rollup_key
+from .routers import pin_to_primary
+
+
+IMAGE_FIELDS = ('image', 'design_image')
+
+connection_created.connect(configure_connection, dispatch_uid='design_app.configure_connection')
+connection_created.connect(install_query_recorder, dispatch_uid='design_app.install_query_recorder')
+
+
+def release_file(storage, name):
+    if name and storage.release(name):
+        transaction.on_commit(lambda: delete_thumbnails(storage, name))
+
+
+@receiver([post_save, post_delete], sender=DesignRequest)
+@receiver([post_save, post_delete], sender=DesignCategory)
+def pin_after_write(sender, **kwargs):
+    # После записи читаем с основной БД до конца запроса (и ещё REPLICA_PIN_SECONDS через cookie)
+    pin_to_primary()
+
+
+@receiver(post_save, sender=DesignRequest)
+def design_request_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    old_status = getattr(instance, '_loaded_status', None)
+    old_category_id = getattr(instance, '_loaded_category_id', None) or instance.category_id
+    if created or (old_status is not None and (old_status, old_category_id) != (instance.status, instance.category_id)):
+        pending = pending_category_ids({old_category_id, instance.category_id})
+        counter_deltas = Counter()
+        rollup_deltas = Counter()
+        if not created and old_category_id not in pending:
+            counter_deltas.update({'total': -1, old_status: -1})
+            rollup_deltas[rollup_key(instance.created_at, old_category_id, old_status)] -= 1
+        if instance.category_id not in pending:
+            counter_deltas.update({'total': 1, instance.status: 1})
+            rollup_deltas[rollup_key(instance.created_at, instance.category_id, instance.status)] += 1
+        adjust_counters(counter_deltas)
+        adjust_rollups(rollup_deltas)
+    instance._loaded_status = instance.status
+    instance._loaded_category_id = instance.category_id
+
+    loaded_files = getattr(instance, '_loaded_files', {})
+    for field in IMAGE_FIELDS:
+        field_file = getattr(instance, field)
+        old_name = loaded_files.get(field)
+        if old_name and old_name != field_file.name:
+            release_file(field_file.storage, old_name)
+    instance._loaded_files = {field: getattr(instance, field).name for field in IMAGE_FIELDS}
+    invalidate(bump_requests_version)
+
+
+@receiver(post_delete, sender=DesignRequest)
+def design_request_deleted(sender, instance, **kwargs):
+    if not purging_category() and not pending_category_ids([instance.category_id]):
+        adjust_counters({'total': -1, instance.status: -1})
+        adjust_rollups({rollup_key(instance.created_at, instance.category_id, instance.status): -1})
+    for field in IMAGE_FIELDS:
+        field_file = getattr(instance, field)
+        release_file(field_file.storage, field_file.name)
+    invalidate(bump_requests_version)
+
+
+@receiver(post_save, sender=DesignCategory)
+def design_category_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_counters({'categories': 1})
+    invalidate(bump_requests_version)
+    invalidate(bump_categories_version)
+
+
+@receiver(post_delete, sender=DesignCategory)
+def design_category_deleted(sender, instance, **kwargs):
+    if instance.deletion_requested_at is None:
+        adjust_counters({'categories': -1})
+    invalidate(bump_requests_version)
+    invalidate(bump_categories_version)
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def custom_user_changed(sender, instance, raw=False, **kwargs):
+    # Смена пароля, прав или ФИО сразу видна во всех сессиях пользователя
+    invalidate(lambda: invalidate_cached_user(instance.pk))
+
+
+@receiver(request_finished, dispatch_uid='design_app.resume_category_deletion')
+def resume_category_deletion(sender, **kwargs):
+    # Один раз на процесс, уже после ответа: доделать удаление категорий, прерванное перезапуском
+    request_finished.disconnect(dispatch_uid='design_app.resume_category_deletion')
+    resume_deletion_worker()
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_cached_user(user.pk)
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем sha256 содержимого: одинаковые байты лежат на диске один раз.
+
+    Число ссылок на каждый файл ведётся в MediaBlob; delete() уменьшает его
+    и удаляет файл, только когда ссылок не осталось.
+    """
+
+    @cached_property
+    def derivative_storage(self):
+        # Миниатюры и прочие производные файлы пишутся по точному имени, без адресации по содержимому
+        return FileSystemStorage(location=self.location, base_url=self.base_url)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting in ('MEDIA_ROOT', 'MEDIA_URL'):
+            self.__dict__.pop('derivative_storage', None)
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        from .models import MediaBlob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+
+        # В транзакции вызывающего (DesignRequest.save): если сохранение модели откатится,
+        # откатится и ссылка. Файл проверяется и пишется под той же блокировкой записи,
+        # что и удаление в _delete_unreferenced, поэтому они не перемежаются
+        with transaction.atomic(savepoint=False):
+            MediaBlob.objects.get_or_create(name=name)
+            MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+            if not self.exists(name):
+                stored_name = self._save(name, content)
+                if stored_name != name:
+                    # Тот же файл параллельно записал другой процесс
+                    super().delete(stored_name)
+        return name
+
+    def release(self, name):
+        from .models import MediaBlob
+
+        with transaction.atomic():
+            if MediaBlob.objects.filter(name=name, refcount__gt=1).update(refcount=F('refcount') - 1):
+                return False
+            deleted, _ = MediaBlob.objects.filter(name=name).delete()
+        if not deleted:
+            return False
+
+        transaction.on_commit(lambda: self._delete_unreferenced(name))
+        return True
+
+    def _delete_unreferenced(self, name):
+        from .models import MediaBlob
+
+        # BEGIN IMMEDIATE берёт блокировку записи: параллельный save() того же содержимого
+        # либо уже вернул строку MediaBlob (и файл нужен), либо запишет файл заново после нас
+        with transaction.atomic():
+            if not MediaBlob.objects.filter(name=name).exists():
+                super().delete(name)
+
+    def delete(self, name):
+        self.release(name)
+
+
+_media_storage = ContentAddressedStorage()
+
+
+def media_storage():
+    return _media_storage
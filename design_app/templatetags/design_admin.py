@@ -0,0 +1,73 @@
+import datetime
+
+from django import template
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from ..models import DailyRequestRollup
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def rollup_date_hierarchy(cl):
+    # Как date_hierarchy из админки, но годы, месяцы и дни берутся из дневных сводок:
+    # без MIN/MAX и SELECT DISTINCT по всей таблице заявок
+    field_name = cl.date_hierarchy
+    year_field, month_field, day_field = (f'{field_name}__{part}' for part in ('year', 'month', 'day'))
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+    dates = DailyRequestRollup.objects.filter(count__gt=0)
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field_name}__'])
+
+    if not year_lookup:
+        years = list(dates.dates('date', 'year'))
+        if len(years) != 1:
+            return {
+                'show': True,
+                'back': None,
+                'choices': [{'link': link({year_field: str(year.year)}), 'title': str(year.year)} for year in years],
+            }
+        year_lookup = years[0].year
+
+    if not month_lookup:
+        months = dates.filter(date__year=year_lookup).dates('date', 'month')
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month.month}),
+                    'title': capfirst(formats.date_format(month, 'YEAR_MONTH_FORMAT')),
+                }
+                for month in months
+            ],
+        }
+
+    if not day_lookup:
+        days = dates.filter(date__year=year_lookup, date__month=month_lookup).dates('date', 'day')
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year_lookup}), 'title': str(year_lookup)},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month_lookup, day_field: day.day}),
+                    'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT')),
+                }
+                for day in days
+            ],
+        }
+
+    day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+    return {
+        'show': True,
+        'back': {
+            'link': link({year_field: year_lookup, month_field: month_lookup}),
+            'title': capfirst(formats.date_format(day, 'YEAR_MONTH_FORMAT')),
+        },
+        'choices': [{'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))}],
+    }
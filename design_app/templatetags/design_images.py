@@ -0,0 +1,29 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..images import THUMBNAIL_WIDTHS, thumbnail_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail(field_file, width, alt='', css_class='', style=''):
+    if not field_file:
+        return ''
+
+    storage = field_file.storage
+    src_width = next((w for w in THUMBNAIL_WIDTHS if w >= width), THUMBNAIL_WIDTHS[-1])
+    if not storage.exists(thumbnail_name(field_file.name, src_width)):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="lazy">',
+            field_file.url, alt, css_class, style,
+        )
+
+    srcset = format_html_join(
+        ', ', '{} {}w',
+        ((storage.url(thumbnail_name(field_file.name, w)), w) for w in THUMBNAIL_WIDTHS),
+    )
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}px" alt="{}" class="{}" style="{}" loading="lazy">',
+        storage.url(thumbnail_name(field_file.name, src_width)), srcset, width, alt, css_class, style,
+    )
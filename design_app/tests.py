@@ -1,3 +1,1305 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.sessions.models import Session
+from django.core import serializers
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve
+from django.utils import timezone
+from PIL import Image
+
+from . import categories
+from .categories import CategoryChoiceField, get_categories
+from . import deletion
+from .admin import DesignRequestPaginator
+from .backends import CachedModelBackend
+from .benchmarking import percentile
+from .cache import REQUESTS_VERSION_KEY, bump_requests_version, get_requests_version, invalidate, versioned
+from .counters import get_counters, rebuild_counters
+from .management.commands.benchmark import Command as BenchmarkCommand
+from .db import apply_sqlite_pragmas
+from .deletion import purge_pending_categories, request_category_deletion
+from .images import (
+    MAX_DIMENSION, THUMBNAIL_WIDTHS, delete_thumbnails, derivative_storage, ensure_thumbnails, generate_field_thumbnails,
+    ingest_image, thumbnail_name, thumbnail_names,
+)
+from .templatetags.design_images import thumbnail
+from .transitions import bulk_transition, delete_request, transition_status
+from .metrics import Registry, registry
+from .middleware import (
+    REPLICA_PIN_COOKIE, QueryBudgetExceeded, QueryInspectionMiddleware, ReplicaPinMiddleware, query_shape,
+)
+from .models import (
+    CustomUser, DailyRequestRollup, DesignCategory, DesignRequest, MediaBlob, RequestCounter, StaleVersionError,
+)
+from .pagination import PAGE_SIZE, decode_cursor, encode_cursor, keyset_page, keyset_queryset
+from .rollups import MAX_ANALYTICS_DAYS, analytics, parse_days, rebuild_rollups
+from .routers import PrimaryReplicaRouter, pin_to_primary, pinned_to_primary, unpin, use_primary
+from .search import SEARCH_LIMIT, ranked
+from .urls import build_urlpatterns, urlpatterns
+
+
+def image_file(name='room.jpg', size=(64, 48), color=(200, 30, 30), fmt='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=Image.MIME[fmt])
+
+
+def rollup_rows():
+    return sorted(DailyRequestRollup.objects.filter(count__gt=0).values_list('date', 'category_id', 'status', 'count'))
+
+
+class TemporaryMediaMixin:
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class SqlitePragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma('cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+
+    def test_rejects_unsafe_values(self):
+        with connection.cursor() as cursor:
+            for pragmas in ({'cache_size': '1; DROP TABLE x'}, {'Journal-Mode': 'WAL'}):
+                with self.assertRaises(ValueError):
+                    apply_sqlite_pragmas(cursor, pragmas)
+
+
+class QueryPlanTests(TestCase):
+    FULL_SCAN = re.compile(r'\bSCAN design_app_designrequest\b(?! USING (COVERING )?INDEX)')
+    TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        category = DesignCategory.objects.create(name='Гостиная')
+        cls.design_request = DesignRequest.objects.create(
+            user=cls.user, category=category, title='Заявка', description='Описание', image='request_images/room.jpg'
+        )
+
+    def assertIndexedPlan(self, queryset):
+        plan = queryset.explain()
+        self.assertIsNone(self.FULL_SCAN.search(plan), plan)
+        self.assertIsNone(self.TEMP_SORT.search(plan), plan)
+
+    def test_index_querysets(self):
+        self.assertIndexedPlan(DesignRequest.objects.filter(status='completed').order_by('-created_at')[:4])
+        self.assertIndexedPlan(DesignRequest.objects.filter(status='accepted').values('id'))
+
+    def test_admin_requests_querysets(self):
+        cursor = encode_cursor(self.design_request)
+        base = DesignRequest.objects.select_related('user', 'category')
+        for queryset in (base, base.filter(status='new')):
+            self.assertIndexedPlan(keyset_queryset(queryset)[:PAGE_SIZE + 1])
+            self.assertIndexedPlan(keyset_queryset(queryset, cursor)[:PAGE_SIZE + 1])
+
+    def test_profile_queryset(self):
+        self.assertIndexedPlan(DesignRequest.objects.filter(user=self.user))
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        cls.category = DesignCategory.objects.create(name='Кухня')
+
+    def create(self, status='new'):
+        return DesignRequest.objects.create(
+            user=self.user, category=self.category, title='Заявка', description='Описание', status=status,
+        )
+
+    def assertCounters(self, **expected):
+        counters = get_counters()
+        self.assertEqual({name: counters[name] for name in expected}, expected)
+        self.assertEqual(counters, rebuild_counters())
+
+    def test_counters_follow_writes(self):
+        first, second = self.create(), self.create()
+        self.create('completed')
+        self.assertCounters(total=3, new=2, accepted=0, completed=1, categories=1)
+
+        first.status, first.admin_comment = 'accepted', 'В работе'
+        first.save()
+        self.assertCounters(total=3, new=1, accepted=1, completed=1)
+        second.delete()
+        self.assertCounters(total=2, new=0, accepted=1, completed=1)
+        DesignCategory.objects.create(name='Ванная')
+        self.assertCounters(categories=2)
+
+    def test_single_query_and_rebuild_when_missing(self):
+        self.create()
+        with self.assertNumQueries(1):
+            get_counters()
+        RequestCounter.objects.filter(name='new').delete()
+        self.assertCounters(total=1, new=1)
+        self.assertTrue(RequestCounter.objects.filter(name='new').exists())
+
+    def test_dashboard_shows_counters(self):
+        self.create()
+        self.create('accepted')
+        staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/manager/dashboard/')
+        self.assertEqual(
+            [response.context[name] for name in ('total_requests', 'new_requests_count', 'accepted_requests_count')],
+            [2, 1, 1],
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        category = DesignCategory.objects.create(name='Кухня')
+        DesignRequest.objects.bulk_create([
+            DesignRequest(user=cls.staff, category=category, title=f'Заявка {i}', description='Описание', status='new')
+            for i in range(PAGE_SIZE * 2 + 3)
+        ])
+        # Одинаковое created_at у части заявок: порядок добирается по id
+        created_at = timezone.now()
+        DesignRequest.objects.filter(id__in=DesignRequest.objects.order_by('id').values('id')[:PAGE_SIZE + 5]).update(
+            created_at=created_at,
+        )
+
+    def test_pages_cover_all_rows_once(self):
+        seen, cursor = [], None
+        while True:
+            items, cursor = keyset_page(DesignRequest.objects.all(), cursor)
+            seen.extend(item.id for item in items)
+            if cursor is None:
+                break
+        expected = list(DesignRequest.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        self.assertIsNone(decode_cursor('не курсор'))
+        self.assertEqual(keyset_page(DesignRequest.objects.all(), 'AAAA')[0], keyset_page(DesignRequest.objects.all())[0])
+
+    def test_list_view_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/manager/requests/')
+        self.assertEqual(len(response.context['design_requests']), PAGE_SIZE)
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get('/manager/requests/')
+        with CaptureQueriesContext(connection) as next_page:
+            response = self.client.get(f"/manager/requests/?after={response.context['next_cursor']}")
+        self.assertEqual(len(response.context['design_requests']), PAGE_SIZE)
+        self.assertEqual(len(next_page), len(first_page))
+        self.assertLess(len(first_page), 10)
+
+
+@override_settings(QUERY_INSPECTION=True, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        cls.staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        categories = [DesignCategory.objects.create(name=f'Категория {i}') for i in range(3)]
+        cls.design_requests = [
+            DesignRequest.objects.create(
+                user=cls.client_user, category=categories[i % 3], title=f'Заявка {i}', description='Описание',
+                image='request_images/room.jpg', status=status,
+                admin_comment='Комментарий' if status != 'new' else '',
+                design_image='design_images/design.jpg' if status == 'completed' else None,
+            )
+            for i, status in enumerate(['new', 'new', 'accepted', 'completed', 'completed'] * 2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_every_url_has_budget(self):
+        url_names = {f'design_app:{pattern.name}' for pattern in urlpatterns}
+        self.assertEqual(url_names - settings.QUERY_BUDGETS.keys(), set())
+
+    def test_anonymous_pages(self):
+        for url in ('/', '/register/', '/login/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post('/login/', {'username': 'client', 'password': 'password'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get('/logout/').status_code, 302)
+
+    def test_register(self):
+        response = self.client.post('/register/', {
+            'fio': 'Новый Клиент', 'username': 'new-client', 'email': 'new@example.com',
+            'password1': 'password123', 'password2': 'password123', 'agree_to_terms': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_client_pages(self):
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get('/profile/').status_code, 200)
+        self.assertEqual(self.client.get('/create-request/').status_code, 200)
+        response = self.client.post('/create-request/', {
+            'title': 'Новая заявка', 'description': 'Описание',
+            'category': self.design_requests[0].category_id, 'image': image_file(),
+        })
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(f'/delete-request/{self.design_requests[0].id}/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_manager_pages(self):
+        self.client.force_login(self.staff)
+        design_request = self.design_requests[1]
+        for url in (
+            '/manager/dashboard/', '/manager/requests/', '/manager/requests/?status=completed',
+            '/manager/requests/?q=заявка', '/manager/categories/',
+            f'/manager/change-status/{design_request.id}/', f'/manager/delete-request/{design_request.id}/',
+            '/manager/metrics/', '/manager/events/', '/manager/requests/export/csv/?status=completed',
+            '/manager/requests/export/ndjson/', '/manager/requests/export/zip/',
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+        response = self.client.post(f'/manager/change-status/{design_request.id}/', {
+            'status': 'completed', 'admin_comment': 'Готово', 'design_image': image_file('design.jpg'),
+        })
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post('/manager/change-status/bulk/', {
+            'ids': [r.id for r in self.design_requests], 'status': 'accepted', 'admin_comment': 'В работе',
+        })
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post('/manager/categories/', {'add_category': '1', 'name': 'Кухня'})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(f'/manager/delete-request/{self.design_requests[0].id}/')
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(QUERY_BUDGETS={'design_app:index': 2}, QUERY_REPEAT_THRESHOLD=3)
+class QueryInspectionTests(TestCase):
+    def check(self, queries):
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve('/')
+        QueryInspectionMiddleware(lambda request: None).check(request, queries)
+
+    def test_in_lists_share_shape(self):
+        self.assertEqual(query_shape('SELECT 1 WHERE id IN (%s, %s, %s)'), query_shape('SELECT 1 WHERE id IN (%s)'))
+
+    def test_repeated_query_reported(self):
+        with self.assertLogs('design_app.middleware', 'WARNING') as logs:
+            self.check(['SELECT user WHERE id = %s'] * 3)
+        self.assertIn('design_app:index: запрос повторён 3 раз (N+1)', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_budget_enforced_in_strict_mode(self):
+        self.check(['SELECT 1', 'SELECT 2'])
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'design_app:index: 3 запросов при бюджете 2'), \
+                self.assertLogs('design_app.middleware', 'WARNING'):
+            self.check(['SELECT 1', 'SELECT 2', 'SELECT 3'])
+
+
+class VersionedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_producer_called_until_version_bump(self):
+        producer = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(versioned('answer', producer), 1)
+        self.assertEqual(versioned('answer', producer), 1)
+        bump_requests_version()
+        self.assertEqual(versioned('answer', producer), 2)
+        self.assertEqual(producer.call_count, 2)
+
+    def test_evicted_version_does_not_repeat(self):
+        version = get_requests_version()
+        cache.delete(REQUESTS_VERSION_KEY)
+        self.assertGreater(get_requests_version(), version)
+
+    def test_invalidate_again_after_commit(self):
+        callback = mock.Mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate(callback)
+            callback.assert_called_once_with()
+        self.assertEqual(callback.call_count, 2)
+
+    def test_index_sees_new_completed_request(self):
+        user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        category = DesignCategory.objects.create(name='Кухня')
+        self.assertEqual(list(self.client.get('/').context['completed_requests']), [])
+        with self.assertNumQueries(0):
+            versioned('index', lambda: self.fail('Кэш не использован'))
+
+        design_request = DesignRequest.objects.create(
+            user=user, category=category, title='Готово', description='Описание', status='completed',
+        )
+        self.assertEqual(list(self.client.get('/').context['completed_requests']), [design_request])
+
+
+class BulkTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        category = DesignCategory.objects.create(name='Кухня')
+        cls.plain, cls.with_image = [
+            DesignRequest.objects.create(
+                user=cls.staff, category=category, title=f'Заявка {i}', description='Описание', design_image=design_image,
+            )
+            for i, design_image in enumerate([None, 'design_images/design.jpg'])
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalid_status_rejects_all(self):
+        self.assertEqual(bulk_transition([self.plain.id], 'new'), ([], {self.plain.id: ['Неверный статус']}))
+
+    def test_item_errors_do_not_block_others(self):
+        missing = self.with_image.id + 100
+        updated, errors = bulk_transition([self.plain.id, self.with_image.id, missing], 'completed')
+        self.assertEqual(updated, [self.with_image.id])
+        self.assertEqual(errors, {
+            self.plain.id: ['Для статуса "Выполнено" обязательно изображение дизайна'],
+            missing: ['Заявка не найдена'],
+        })
+        self.with_image.refresh_from_db()
+        self.assertEqual((self.with_image.status, self.with_image.version), ('completed', 2))
+        self.assertEqual(DesignRequest.objects.get(id=self.plain.id).status, 'new')
+
+    def test_counters_and_rollups_follow_bulk_change(self):
+        updated, errors = bulk_transition([self.plain.id, self.with_image.id], 'accepted', '  В работе ')
+        self.assertEqual((updated, errors), (sorted([self.plain.id, self.with_image.id]), {}))
+        self.assertEqual(set(DesignRequest.objects.values_list('admin_comment', flat=True)), {'В работе'})
+        self.assertEqual(get_counters(), rebuild_counters())
+        rollups = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), rollups)
+
+    def test_json_response_reports_partial_success(self):
+        self.client.force_login(self.staff)
+        response = self.client.post('/manager/change-status/bulk/', {
+            'ids': [self.plain.id, self.with_image.id], 'status': 'completed',
+        }, headers={'accept': 'application/json'})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['updated'], [self.with_image.id])
+        self.assertEqual(list(response.json()['errors']), [str(self.plain.id)])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    router = PrimaryReplicaRouter()
+
+    def setUp(self):
+        # Записи в других тестах закрепляют за основной БД весь поток
+        self.addCleanup(unpin, pin_to_primary(False))
+
+    def test_reads_go_to_replica_unless_pinned(self):
+        self.assertEqual(self.router.db_for_read(DesignRequest), 'replica')
+        self.assertIsNone(self.router.db_for_read(CustomUser))
+        self.assertEqual(self.router.db_for_write(DesignRequest), 'default')
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(DesignRequest), 'default')
+        self.assertEqual(self.router.db_for_read(DesignCategory), 'replica')
+
+    def test_migrations_do_not_read_from_replica(self):
+        state = MigrationLoader(connection).project_state(('design_app', '0002_requestcounter'))
+        self.assertIsNone(self.router.db_for_read(state.apps.get_model('design_app', 'DesignRequest')))
+
+    def test_write_paths_read_from_primary(self):
+        bulk_transition([], 'accepted')
+        self.assertIs(pinned_to_primary(), True)
+
+    def middleware(self, write=False, cookies=None):
+        seen = []
+
+        def view(request):
+            if write:
+                pin_to_primary()
+            seen.append(self.router.db_for_read(DesignRequest))
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaPinMiddleware(view)(request)
+        self.assertFalse(pinned_to_primary())
+        return seen[0], response
+
+    def test_write_sets_pin_cookie(self):
+        db, response = self.middleware(write=True)
+        self.assertEqual(db, 'default')
+        self.assertEqual(response.cookies[REPLICA_PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_cookie_pins_without_extending(self):
+        db, response = self.middleware(cookies={REPLICA_PIN_COOKIE: '1'})
+        self.assertEqual(db, 'default')
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+        # Новая запись при действующей cookie продлевает её
+        self.assertIn(REPLICA_PIN_COOKIE, self.middleware(write=True, cookies={REPLICA_PIN_COOKIE: '1'})[1].cookies)
+
+    def test_plain_read_uses_replica(self):
+        db, response = self.middleware()
+        self.assertEqual(db, 'replica')
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+
+class PurgeSessionsTests(TestCase):
+    def test_deletes_only_expired_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1)) for i in range(5)]
+            + [Session(session_key='active', session_data='', expire_date=now + timedelta(days=1))]
+        )
+        out = StringIO()
+        with CaptureQueriesContext(connection) as captured:
+            call_command('purge_sessions', batch_size=2, pause=0, stdout=out)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active'])
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in captured), 3)
+
+
+class CachedUserTests(TestCase):
+    backend = CachedModelBackend()
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+
+    def test_user_served_from_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_changes_invalidate_cached_user(self):
+        self.backend.get_user(self.user.pk)
+        self.user.is_staff = True
+        self.user.set_password('new-password')
+        self.user.save()
+        cached = self.backend.get_user(self.user.pk)
+        self.assertTrue(cached.is_staff)
+        self.assertTrue(cached.check_password('new-password'))
+
+        self.user.delete()
+        self.assertIsNone(self.backend.get_user(cached.pk))
+
+    def test_logout_invalidates_cached_user(self):
+        self.client.force_login(self.user)
+        self.backend.get_user(self.user.pk)
+        self.client.get('/logout/')
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = Registry()
+        for value in (0, 2, 2, 100):
+            metrics.observe('design_app_db_queries', 'design_app:"index"', value)
+        output = metrics.render()
+        self.assertIn('# TYPE design_app_db_queries histogram', output)
+        self.assertIn('design_app_db_queries_bucket{view="design_app:\\"index\\"",le="0"} 1', output)
+        self.assertIn('design_app_db_queries_bucket{view="design_app:\\"index\\"",le="2"} 3', output)
+        self.assertIn('design_app_db_queries_bucket{view="design_app:\\"index\\"",le="89"} 3', output)
+        self.assertIn('design_app_db_queries_bucket{view="design_app:\\"index\\"",le="+Inf"} 4', output)
+        self.assertIn('design_app_db_queries_sum{view="design_app:\\"index\\""} 104.000000', output)
+
+    def test_requests_recorded_and_exposed(self):
+        response = self.client.get('/')
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+        # Медиа и другие URL вне design_app в гистограммы не попадают
+        self.client.get('/media/missing.jpg')
+
+        staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        self.client.force_login(staff)
+        output = self.client.get('/manager/metrics/').content.decode()
+        self.assertIn('design_app_request_duration_seconds_count{view="design_app:index"} 1', output)
+        self.assertIn('design_app_template_duration_seconds_count{view="design_app:index"} 1', output)
+        self.assertNotIn('media', output)
+
+    def test_metrics_require_manager(self):
+        self.assertEqual(self.client.get('/manager/metrics/').status_code, 302)
+
+
+class ExportTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        category = DesignCategory.objects.create(name='Кухня')
+        cls.new = DesignRequest.objects.create(
+            user=cls.staff, category=category, title='Новая, "с кавычками"', description='Строка\nвторая',
+        )
+        cls.completed = DesignRequest.objects.create(
+            user=cls.staff, category=category, title='Готовая', description='Описание', status='completed',
+            admin_comment='Готово', image='request_images/missing.jpg',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def csv_rows(self, url):
+        content = self.export(url).decode()
+        self.assertTrue(content.startswith('\ufeffid,title,'))
+        return list(csv.DictReader(content.lstrip('\ufeff').splitlines(keepends=True)))
+
+    def test_csv(self):
+        rows = self.csv_rows('/manager/requests/export/csv/')
+        self.assertEqual([row['title'] for row in rows], ['Новая, "с кавычками"', 'Готовая'])
+        self.assertEqual(rows[0]['description'], 'Строка\nвторая')
+        self.assertEqual(rows[1]['category'], 'Кухня')
+        rows = self.csv_rows('/manager/requests/export/csv/?status=completed')
+        self.assertEqual([row['id'] for row in rows], [str(self.completed.id)])
+
+    def test_csv_escapes_formulas(self):
+        DesignRequest.objects.filter(id=self.new.id).update(title='=HYPERLINK("http://example.com")', description='-1')
+        DesignRequest.objects.filter(id=self.completed.id).update(title='@SUM(A1)', admin_comment='\tГотово')
+        rows = self.csv_rows('/manager/requests/export/csv/')
+        self.assertEqual([row['title'] for row in rows], ['\'=HYPERLINK("http://example.com")', "'@SUM(A1)"])
+        self.assertEqual((rows[0]['description'], rows[1]['admin_comment']), ("'-1", "'\tГотово"))
+        self.assertEqual(rows[1]['category'], 'Кухня')
+
+        lines = self.export('/manager/requests/export/ndjson/').decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['title'], '=HYPERLINK("http://example.com")')
+
+    def test_ndjson(self):
+        lines = self.export('/manager/requests/export/ndjson/').decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [self.new.id, self.completed.id])
+        self.assertEqual(rows[1]['fio'], 'Менеджер')
+        self.assertEqual(rows[1]['image'], 'request_images/missing.jpg')
+
+    def test_zip_skips_missing_files(self):
+        design_request = DesignRequest.objects.create(
+            user=self.staff, category=self.new.category, title='С фото', description='Описание', image=image_file(),
+        )
+        with self.assertLogs('design_app.exports', 'WARNING'):
+            content = self.export('/manager/requests/export/zip/')
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertEqual(archive.namelist(), [f'{design_request.id}/image.jpg'])
+            self.assertEqual(archive.read(f'{design_request.id}/image.jpg'), design_request.image.read())
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/manager/requests/export/xml/').status_code, 404)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        cls.kitchen = DesignCategory.objects.create(name='Кухня')
+        cls.bathroom = DesignCategory.objects.create(name='Ванная')
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, category, days_ago=0, status='new'):
+        design_request = DesignRequest.objects.create(
+            user=self.user, category=category, title='Заявка', description='Описание', status=status,
+        )
+        if days_ago:
+            # created_at с auto_now_add: сдвигаем вместе со сводками, как будто заявка создана раньше
+            created_at = design_request.created_at - timedelta(days=days_ago)
+            DesignRequest.objects.filter(id=design_request.id).update(created_at=created_at)
+            rebuild_rollups()
+        return design_request
+
+    def assertRollupsMatchRebuild(self):
+        rollups = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), rollups)
+
+    def test_rollups_follow_writes(self):
+        first = self.create(self.kitchen)
+        second = self.create(self.kitchen)
+        self.create(self.bathroom, status='completed')
+        self.assertRollupsMatchRebuild()
+
+        first = DesignRequest.objects.get(id=first.id)
+        first.status, first.admin_comment = 'accepted', 'В работе'
+        first.category = self.bathroom
+        first.save()
+        self.assertRollupsMatchRebuild()
+        second.delete()
+        self.assertRollupsMatchRebuild()
+        bulk_transition([first.id], 'completed')
+        self.assertRollupsMatchRebuild()
+
+    def test_analytics_window(self):
+        self.create(self.kitchen)
+        self.create(self.kitchen, status='completed')
+        self.create(self.bathroom, days_ago=3)
+        self.create(self.bathroom, days_ago=40)
+
+        data = analytics(7)
+        self.assertEqual(len(data['daily']), 7)
+        self.assertEqual(data['daily'][-1]['date'], timezone.localdate())
+        self.assertEqual(data['daily'][-1]['total'], 2)
+        self.assertEqual(data['daily'][-4]['new'], 1)
+        self.assertEqual(data['totals'], {'new': 2, 'accepted': 0, 'completed': 1, 'total': 3})
+        self.assertEqual([row['category'] for row in data['categories']], ['Кухня', 'Ванная'])
+        self.assertEqual(analytics(60)['totals']['total'], 4)
+
+    def test_days_parameter(self):
+        self.assertEqual(parse_days('abc'), 30)
+        self.assertEqual(parse_days('0'), 1)
+        self.assertEqual(parse_days('100000'), MAX_ANALYTICS_DAYS)
+        staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(len(self.client.get('/manager/analytics/?days=5').json()['daily']), 5)
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'password', fio='Администратор')
+        category = DesignCategory.objects.create(name='Кухня')
+        DesignRequest.objects.bulk_create([
+            DesignRequest(user=cls.admin, category=category, title=f'Заявка {i}', description='Описание', status='new')
+            for i in range(5)
+        ])
+        rebuild_counters()
+        rebuild_rollups()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unfiltered_count_from_counters(self):
+        paginator = DesignRequestPaginator(DesignRequest.objects.order_by('id'), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+
+    def test_filtered_count_bounded(self):
+        paginator = DesignRequestPaginator(DesignRequest.objects.filter(status='new').order_by('id'), 2)
+        paginator.count_limit = 3
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(DesignRequestPaginator(DesignRequest.objects.filter(status='completed'), 2).count, 0)
+
+    def test_changelist_pages(self):
+        self.client.force_login(self.admin)
+        year = timezone.localdate().year
+        for url in (
+            '/admin/design_app/designrequest/', '/admin/design_app/designrequest/?status__exact=new',
+            '/admin/design_app/designrequest/?q=заявка', f'/admin/design_app/designrequest/?created_at__year={year}',
+            '/admin/design_app/customuser/',
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+        response = self.client.get('/admin/design_app/designrequest/')
+        # Один год в сводках: сразу ссылки на месяцы, как в стандартном date_hierarchy
+        self.assertContains(response, f'created_at__month={timezone.localdate().month}&amp;created_at__year={year}')
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    def test_search_by_username(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/design_app/designrequest/?q=admin')
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+        CustomUser.objects.filter(id=self.admin.id).update(username='chief')
+        response = self.client.get('/admin/design_app/designrequest/?q=chief')
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertEqual(self.client.get('/admin/design_app/designrequest/?q=admin').context['cl'].result_count, 0)
+
+
+class AsyncUrls:
+    urlpatterns = [path('', include((build_urlpatterns(use_async_views=True), 'design_app')))]
+
+
+@override_settings(ROOT_URLCONF=AsyncUrls)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        cls.client_user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        category = DesignCategory.objects.create(name='Кухня')
+        for i, status in enumerate(['new', 'completed', 'completed', 'accepted'] * 8):
+            DesignRequest.objects.create(
+                user=cls.client_user, category=category, title=f'Заявка {i}', description='Описание', status=status,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def context_value(self, response, name):
+        self.assertEqual(response.status_code, 200)
+        value = response.context[name]
+        # QuerySet синхронного view (уже вычисленный шаблоном) и список асинхронного сравниваем как списки
+        return value if value is None or isinstance(value, (int, str)) else list(value)
+
+    def sync_get(self, user, url, context_name):
+        self.client.force_login(user)
+        with override_settings(ROOT_URLCONF='design_project.urls'):
+            return self.context_value(self.client.get(url), context_name)
+
+    async def async_get(self, user, url):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        return await client.get(url)
+
+    async def test_same_data_as_sync_views(self):
+        for user, url, context_name in (
+            (self.client_user, '/', 'completed_requests'),
+            (self.client_user, '/profile/', 'user_requests'),
+            (self.staff, '/manager/dashboard/', 'completed_requests_count'),
+            (self.staff, '/manager/requests/?status=completed', 'design_requests'),
+            (self.staff, '/manager/requests/', 'next_cursor'),
+        ):
+            expected = await sync_to_async(self.sync_get)(user, url, context_name)
+            self.assertEqual(self.context_value(await self.async_get(user, url), context_name), expected, url)
+
+    async def test_streaming_export(self):
+        response = await self.async_get(self.staff, '/manager/requests/export/ndjson/?status=accepted')
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 8)
+
+
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        cls.category = DesignCategory.objects.create(name='Кухня')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.design_request = DesignRequest.objects.create(
+            user=self.user, category=self.category, title='Старое название', description='Описание',
+        )
+
+    def test_card_cached_until_request_changes(self):
+        self.assertContains(self.client.get('/profile/'), 'Старое название')
+        # update() не меняет updated_at: карточка берётся из кэша
+        DesignRequest.objects.filter(id=self.design_request.id).update(title='Без сброса')
+        self.assertNotContains(self.client.get('/profile/'), 'Без сброса')
+
+        design_request = DesignRequest.objects.get(id=self.design_request.id)
+        design_request.title = 'Новое название'
+        design_request.save()
+        self.assertContains(self.client.get('/profile/'), 'Новое название')
+
+    def test_category_rename_refreshes_card(self):
+        self.assertContains(self.client.get('/profile/'), 'Кухня')
+        DesignCategory.objects.filter(id=self.category.id).update(name='Гостиная')
+        self.assertContains(self.client.get('/profile/'), 'Гостиная')
+
+
+class BenchmarkReportTests(SimpleTestCase):
+    def test_percentile(self):
+        self.assertEqual(percentile([], 0.5), 0.0)
+        self.assertEqual(percentile([5, 1, 3, 2, 4], 0.5), 3)
+        self.assertEqual(percentile([5, 1, 3, 2, 4], 0.95), 5)
+        self.assertEqual(percentile([7], 0.99), 7)
+
+    def test_regressions_against_baseline(self):
+        command = BenchmarkCommand()
+        command.options = {'tolerance': 0.25}
+        baseline = {
+            'index': {'p50_ms': 10.0, 'queries': 3},
+            'profile': {'p50_ms': 10.0, 'queries': 3},
+            'removed': {'p50_ms': 1.0, 'queries': 1},
+        }
+        comparison, regressions = command.compare({
+            'index': {'p50_ms': 12.0, 'queries': 3},
+            'profile': {'p50_ms': 13.0, 'queries': 4},
+            'added': {'p50_ms': 1.0, 'queries': 1},
+        }, baseline)
+        self.assertEqual(comparison, {
+            'index': {'p50_ratio': 1.2, 'queries_delta': 0},
+            'profile': {'p50_ratio': 1.3, 'queries_delta': 1},
+        })
+        self.assertEqual(regressions, ['profile: p50 10.0 → 13.0 мс', 'profile: запросов 3 → 4'])
+
+
+class BenchmarkScenarioTests(TestCase):
+    def test_streaming_body_read_inside_measurement(self):
+        staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        DesignRequest.objects.create(
+            user=staff, category=DesignCategory.objects.create(name='Кухня'), title='Заявка', description='Описание',
+        )
+        command = BenchmarkCommand()
+        command.options = {'warmup': 1}
+        command.staff = command.client_user = command.owner = staff
+        scenario = {
+            'url_name': 'export_requests', 'method': 'GET', 'role': 'staff', 'label': '', 'fresh_client': False,
+            'prepare': lambda i: ('/manager/requests/export/csv/', None),
+        }
+        key, result = command.run_scenario(scenario, runs=2)
+        self.assertEqual(key, 'export_requests GET staff')
+        self.assertTrue(result['streaming'])
+        self.assertGreater(result['bytes'], len('\ufeffid,title'))
+
+        client = command.make_client('staff')
+        client.get('/manager/requests/export/csv/').close()
+        with CaptureQueriesContext(connection) as unread:
+            client.get('/manager/requests/export/csv/').close()
+        # Выборка выгрузки выполняется только при чтении тела и должна попасть в замер
+        self.assertEqual(result['queries'], len(unread) + 1)
+
+    def test_old_baseline_not_compared_for_streaming(self):
+        command = BenchmarkCommand()
+        command.options = {'tolerance': 0.25}
+        comparison, regressions = command.compare(
+            {'export_requests GET staff': {'p50_ms': 50.0, 'queries': 4, 'bytes': 100, 'streaming': True}},
+            {'export_requests GET staff': {'p50_ms': 1.0, 'queries': 3}},
+        )
+        self.assertEqual(comparison, {'export_requests GET staff': {'p50_ratio': None, 'queries_delta': None}})
+        self.assertEqual(regressions, [])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        category = DesignCategory.objects.create(name='Кухня')
+        # FTS-индекс заполняют триггеры, поэтому bulk_create подходит
+        DesignRequest.objects.bulk_create(
+            [DesignRequest(user=user, category=category, title='Ремонт ремонт ремонт', description='Описание',
+                           image='request_images/room.jpg') for _ in range(150)]
+            + [DesignRequest(user=user, category=category, title='Прочее', description='ремонт ' + 'слово ' * 50,
+                             image='request_images/room.jpg', status='accepted') for _ in range(5)]
+        )
+
+    def test_filter_applies_before_limit(self):
+        results = ranked(DesignRequest.objects.filter(status='accepted'), 'ремонт')
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(design_request.status == 'accepted' for design_request in results))
+
+    def test_best_matches_first_and_limited(self):
+        results = ranked(DesignRequest.objects.all(), 'ремонт')
+        self.assertEqual(len(results), SEARCH_LIMIT)
+        self.assertTrue(all(design_request.title == 'Ремонт ремонт ремонт' for design_request in results))
+
+    def test_prefix_match_and_empty_query(self):
+        self.assertEqual(len(ranked(DesignRequest.objects.filter(status='accepted'), 'рем')), 5)
+        self.assertEqual(ranked(DesignRequest.objects.all(), '"*'), [])
+
+
+class CategoryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = DesignCategory.objects.create(name='Кухня')
+
+    def test_version_bump_reloads(self):
+        self.assertEqual(list(get_categories()), [self.category])
+        with self.assertNumQueries(0):
+            get_categories()
+        other = DesignCategory.objects.create(name='Ванная')
+        self.assertEqual(set(get_categories()), {self.category, other})
+
+    def test_ttl_reloads_without_version_bump(self):
+        get_categories()
+        # Изменение в другом процессе без общего кэша: версия здесь не меняется
+        DesignCategory.objects.filter(pk=self.category.pk).update(name='Столовая')
+        self.assertEqual(get_categories()[0].name, 'Кухня')
+        categories._state['loaded_at'] -= categories.CATEGORIES_TTL
+        self.assertEqual(get_categories()[0].name, 'Столовая')
+
+    def test_field_checks_database(self):
+        field = CategoryChoiceField(queryset=DesignCategory.objects.all())
+        self.assertEqual(field.clean(str(self.category.pk)), self.category)
+        get_categories()
+        DesignCategory.objects.filter(pk=self.category.pk).update(deletion_requested_at=timezone.now())
+        with self.assertRaises(ValidationError):
+            field.clean(str(self.category.pk))
+        with self.assertRaises(ValidationError):
+            field.clean('abc')
+
+
+class MediaStorageTests(TemporaryMediaMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        self.category = DesignCategory.objects.create(name='Кухня')
+        self.storage = DesignRequest._meta.get_field('image').storage
+
+    def create(self, **kwargs):
+        kwargs = {'title': 'Заявка', 'description': 'Описание', **kwargs}
+        return DesignRequest.objects.create(user=self.user, category=self.category, **kwargs)
+
+    def test_same_content_stored_once(self):
+        first = self.create(image=image_file('a.jpg'))
+        second = self.create(image=image_file('b.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refcount, 2)
+
+        first.delete()
+        self.assertTrue(self.storage.exists(second.image.name))
+        self.assertEqual(MediaBlob.objects.get(name=second.image.name).refcount, 1)
+        second.delete()
+        self.assertFalse(self.storage.exists(second.image.name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_failed_save_does_not_leak_reference(self):
+        with self.assertRaises(IntegrityError):
+            self.create(image=image_file(), title=None)
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_delete_skipped_when_content_saved_again(self):
+        name = self.create(image=image_file()).image.name
+        with transaction.atomic():
+            DesignRequest.objects.get().delete()
+            # Параллельный save() того же содержимого до коммита удаления
+            MediaBlob.objects.create(name=name, refcount=1)
+        self.assertTrue(self.storage.exists(name))
+
+
+class OptimisticVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        cls.staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        cls.category = DesignCategory.objects.create(name='Кухня')
+
+    def setUp(self):
+        cache.clear()
+        self.design_request = DesignRequest.objects.create(
+            user=self.client_user, category=self.category, title='Заявка', description='Описание',
+        )
+        self.client.force_login(self.staff)
+
+    def test_stale_status_change_conflicts(self):
+        data = {'status': 'accepted', 'admin_comment': 'В работе', 'expected_status': 'new', 'version': '1'}
+        url = f'/manager/change-status/{self.design_request.id}/'
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.client.post(url, {**data, 'admin_comment': 'Другой'}).status_code, 409)
+
+        self.design_request.refresh_from_db()
+        self.assertEqual((self.design_request.status, self.design_request.version), ('accepted', 2))
+        self.assertEqual(self.design_request.admin_comment, 'В работе')
+        self.assertEqual(get_counters()['accepted'], 1)
+        self.assertEqual(DailyRequestRollup.objects.get(status='accepted').count, 1)
+
+    def test_stale_delete_keeps_request(self):
+        url = f'/manager/delete-request/{self.design_request.id}/'
+        total = get_counters()['total']
+        self.client.post(url, {'expected_status': 'new', 'version': '2'})
+        self.assertTrue(DesignRequest.objects.filter(id=self.design_request.id).exists())
+
+        self.client.post(url, {'expected_status': 'new', 'version': '1'})
+        self.assertFalse(DesignRequest.objects.filter(id=self.design_request.id).exists())
+        self.assertEqual(get_counters()['total'], total - 1)
+        self.assertEqual(DailyRequestRollup.objects.get(status='new').count, 0)
+
+    def test_save_checks_loaded_version(self):
+        first = DesignRequest.objects.get()
+        second = DesignRequest.objects.get()
+        first.title = 'Первая правка'
+        first.save()
+
+        second.title = 'Вторая правка'
+        with self.assertRaises(StaleVersionError), transaction.atomic():
+            second.save()
+        self.assertEqual(second.version, 1)
+        self.assertEqual(DesignRequest.objects.get().title, 'Первая правка')
+
+    def test_save_does_not_recreate_deleted_request(self):
+        stale = DesignRequest.objects.get()
+        DesignRequest.objects.all().delete()
+        with self.assertRaises(StaleVersionError), transaction.atomic():
+            stale.save()
+        self.assertFalse(DesignRequest.objects.exists())
+
+    def test_fixture_round_trip(self):
+        data = serializers.serialize('json', DesignRequest.objects.all())
+        DesignRequest.objects.update(title='Изменено')
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+        self.assertEqual(DesignRequest.objects.get().title, 'Заявка')
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as fixture:
+            fixture.write(data.replace('"Заявка"', '"Из фикстуры"'))
+        self.addCleanup(os.remove, fixture.name)
+        call_command('loaddata', fixture.name, verbosity=0)
+        self.assertEqual(DesignRequest.objects.get().title, 'Из фикстуры')
+
+
+class ThumbnailTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.storage = DesignRequest._meta.get_field('image').storage
+        self.name = self.storage.save('request_images/room.jpg', image_file(size=(1000, 500)))
+        self.addCleanup(delete_thumbnails, self.storage, self.name)
+
+    def test_generates_webp_for_each_width(self):
+        created = ensure_thumbnails(self.storage, self.name)
+        self.assertEqual(created, thumbnail_names(self.name))
+        for width, name in zip(THUMBNAIL_WIDTHS, created):
+            with derivative_storage(self.storage).open(name) as f, Image.open(f) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (width, width // 2)))
+        # Уже созданы: повторно не пересоздаются
+        self.assertEqual(ensure_thumbnails(self.storage, self.name), [])
+
+        delete_thumbnails(self.storage, self.name)
+        self.assertFalse(any(self.storage.exists(name) for name in created))
+
+    def test_broken_image_does_not_raise(self):
+        name = self.storage.save('request_images/broken.jpg', SimpleUploadedFile('broken.jpg', b'not an image'))
+        with self.assertLogs('design_app.images', 'ERROR'):
+            self.assertEqual(ensure_thumbnails(self.storage, name), [])
+
+    def test_template_tag_uses_srcset_when_ready(self):
+        field_file = DesignRequest(image=self.name).image
+        self.assertNotIn('srcset', thumbnail(field_file, 300))
+        generate_field_thumbnails(field_file)
+        html = thumbnail(field_file, 300)
+        self.assertIn(f'src="{self.storage.url(thumbnail_name(self.name, 400))}"', html)
+        self.assertIn(f'{self.storage.url(thumbnail_name(self.name, 800))} 800w', html)
+
+    def test_backfill_command(self):
+        call_command('backfill_thumbnails', stdout=StringIO())
+        user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        DesignRequest.objects.create(
+            user=user, category=DesignCategory.objects.create(name='Кухня'), title='Заявка', description='Описание',
+            image=self.name,
+        )
+        out = StringIO()
+        call_command('backfill_thumbnails', stdout=out)
+        self.assertIn('Обработано изображений: 1, ошибок: 0', out.getvalue())
+        self.assertTrue(all(self.storage.exists(name) for name in thumbnail_names(self.name)))
+
+
+class IngestImageTests(TestCase):
+    def test_small_image_kept_as_is(self):
+        uploaded = image_file('room.jpeg')
+        self.assertIs(ingest_image(uploaded), uploaded)
+        self.assertEqual(uploaded.name, 'room.jpeg')
+
+    def test_extension_follows_content(self):
+        self.assertEqual(ingest_image(image_file('room.jpg', fmt='PNG')).name, 'room.png')
+
+    def test_large_image_downscaled(self):
+        result = ingest_image(image_file('plan.bmp', size=(MAX_DIMENSION * 2, 100), fmt='BMP'))
+        self.assertEqual(result.name, 'plan.png')
+        with Image.open(result) as image:
+            self.assertEqual(image.size, (MAX_DIMENSION, 50))
+
+    def test_rejects_non_images_and_formats(self):
+        with self.assertRaisesMessage(ValidationError, 'Файл не является изображением'):
+            ingest_image(SimpleUploadedFile('room.jpg', b'not an image'))
+        with self.assertRaisesMessage(ValidationError, 'Неподдерживаемый формат изображения'):
+            ingest_image(image_file('room.gif', fmt='GIF'))
+
+    def test_pixel_limit_lower_for_formats_without_draft(self):
+        with mock.patch('design_app.images.MAX_DECODED_PIXELS', 64 * 48 - 1):
+            with self.assertRaisesMessage(ValidationError, 'Слишком большое разрешение изображения'):
+                ingest_image(image_file('room.png', fmt='PNG'))
+            self.assertTrue(ingest_image(image_file('room.jpg')))
+        with mock.patch('design_app.images.MAX_SOURCE_PIXELS', 64 * 48 - 1):
+            with self.assertRaisesMessage(ValidationError, 'Слишком большое разрешение изображения'):
+                ingest_image(image_file('room.jpg'))
+
+
+class MediaServeTests(TemporaryMediaMixin, TestCase):
+    hashed = 'request_images/ab/' + 'ab' * 32 + '.jpg'
+    legacy = 'request_images/room.jpg'
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        for name in (self.hashed, self.legacy):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(self.content)
+
+    def test_full_response_and_cache_control(self):
+        response = self.client.get('/media/' + self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable')
+        response = self.client.get('/media/' + self.legacy)
+        self.assertEqual(
+            response['Cache-Control'], f'public, max-age={settings.MEDIA_MUTABLE_CACHE_MAX_AGE}, must-revalidate',
+        )
+
+    def test_conditional_requests(self):
+        response = self.client.get('/media/' + self.legacy)
+        self.assertEqual(self.client.get('/media/' + self.legacy, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        response = self.client.get('/media/' + self.legacy, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        response = self.client.get('/media/' + self.hashed, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        response = self.client.get('/media/' + self.hashed, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response['Content-Range'], 'bytes 1019-1023/1024')
+        response = self.client.get('/media/' + self.hashed, HTTP_RANGE='bytes=5000-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */1024'))
+        # If-Range не совпал: файл мог измениться, отдаём целиком
+        response = self.client.get('/media/' + self.hashed, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 400)
+        self.assertEqual(self.client.get('/media/request_images').status_code, 404)
+
+
+class LiveEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user('manager', 'manager@example.com', 'password', fio='Менеджер', is_staff=True)
+        category = DesignCategory.objects.create(name='Кухня')
+        cls.design_requests = [
+            DesignRequest.objects.create(user=cls.staff, category=category, title=f'Заявка {i}', description='Описание')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def events(self, **headers):
+        response = self.client.get('/manager/events/', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_wsgi_snapshot_with_long_retry(self):
+        content = self.events()
+        self.assertTrue(content.startswith(f'retry: {settings.LIVE_EVENTS_WSGI_RETRY_SECONDS * 1000}\n\n'))
+        self.assertIn(f'event: counters\nid: {self.design_requests[-1].id}\n', content)
+        self.assertIn('"total": 3', content)
+        self.assertNotIn('event: request', content)
+
+    def test_reconnect_sends_missed_requests(self):
+        content = self.events(last_event_id=str(self.design_requests[0].id))
+        self.assertEqual(content.count('event: request'), 2)
+        self.assertIn('"title": "Заявка 2"', content)
+
+
+@override_settings(CATEGORY_DELETION_IN_BACKGROUND=False)
+class CategoryDeletionTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        cls.category = DesignCategory.objects.create(name='Кухня')
+        cls.other = DesignCategory.objects.create(name='Ванная')
+        for i, status in enumerate(['new', 'accepted', 'completed', 'new', 'new']):
+            DesignRequest.objects.create(
+                user=cls.user, category=cls.category, title=f'Заявка {i}', description='Описание', status=status,
+            )
+        DesignRequest.objects.create(user=cls.user, category=cls.other, title='Другая', description='Описание')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_marked_category_leaves_aggregates(self):
+        self.assertEqual(request_category_deletion([self.category.id, self.category.id]), 1)
+        self.assertEqual(request_category_deletion([self.category.id]), 0)
+
+        counters = get_counters()
+        self.assertEqual((counters['total'], counters['new'], counters['categories']), (1, 1, 1))
+        self.assertEqual(counters, rebuild_counters())
+        self.assertEqual(analytics()['totals']['total'], 1)
+        rollups = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), rollups)
+        # Заявки ещё на месте: удаляются позже, порциями
+        self.assertEqual(DesignRequest.objects.count(), 6)
+
+    def test_purge_keeps_aggregates_consistent(self):
+        request_category_deletion([self.category.id])
+        counters = get_counters()
+        self.assertEqual(purge_pending_categories(chunk_size=2), {'Кухня': 5})
+
+        self.assertFalse(DesignCategory.objects.filter(id=self.category.id).exists())
+        self.assertEqual(list(DesignRequest.objects.values_list('title', flat=True)), ['Другая'])
+        self.assertEqual(get_counters(), counters)
+        self.assertEqual(get_counters(), rebuild_counters())
+
+    def test_changes_in_marked_category_do_not_touch_aggregates(self):
+        request_category_deletion([self.category.id])
+        new_requests = DesignRequest.objects.filter(category=self.category, status='new').order_by('id')
+        first, second, third = new_requests
+        first.status, first.admin_comment = 'accepted', 'В работе'
+        first.save()
+        self.assertTrue(transition_status(second.id, 'new', second.version, 'accepted', 'В работе'))
+        self.assertEqual(bulk_transition([third.id], 'accepted', 'В работе'), ([third.id], {}))
+        self.assertTrue(delete_request(id=DesignRequest.objects.get(category=self.category, status='completed').id))
+        DesignRequest.objects.create(user=self.user, category=self.category, title='Новая', description='Описание')
+        counters = get_counters()
+        self.assertEqual(counters, rebuild_counters())
+
+        moved = DesignRequest.objects.get(id=first.id)
+        moved.category = self.other
+        moved.save()
+        self.assertEqual(get_counters()['accepted'], counters['accepted'] + 1)
+        self.assertEqual(get_counters(), rebuild_counters())
+
+        purge_pending_categories()
+        self.assertEqual(get_counters(), rebuild_counters())
+        rollups = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), rollups)
+
+    def test_admin_form_hides_marked_category(self):
+        request_category_deletion([self.category.id])
+        model_admin = admin.site._registry[DesignRequest]
+        request = RequestFactory().get('/')
+        request.user = CustomUser.objects.create_user('admin', 'admin@example.com', 'password', fio='Админ', is_superuser=True)
+        field = model_admin.get_form(request)().fields['category']
+        self.assertEqual(list(field.queryset), [self.other])
+
+    def test_worker_resumed_only_with_pending_categories(self):
+        with self.settings(CATEGORY_DELETION_IN_BACKGROUND=True), \
+                mock.patch('design_app.deletion.start_deletion_worker') as start:
+            deletion.resume_deletion_worker()
+            start.assert_not_called()
+            DesignCategory.objects.filter(id=self.category.id).update(deletion_requested_at=timezone.now())
+            deletion.resume_deletion_worker()
+            start.assert_called_once_with()
+
+
+class SweepOrphanedMediaTests(TemporaryMediaMixin, TestCase):
+    def test_removes_only_unreferenced_files(self):
+        user = CustomUser.objects.create_user('client', 'client@example.com', 'password', fio='Клиент')
+        category = DesignCategory.objects.create(name='Кухня')
+        design_request = DesignRequest.objects.create(
+            user=user, category=category, title='Заявка', description='Описание', image=image_file(),
+        )
+        storage = derivative_storage(design_request.image.storage)
+        generate_field_thumbnails(design_request.image)
+        orphan = storage.save('request_images/zz/orphan.jpg', image_file(color=(1, 2, 3)))
+        orphan_thumbnails = [storage.save(name, image_file()) for name in thumbnail_names(orphan)]
+        lonely_thumbnail = storage.save('request_images/yy/lonely.200w.webp', image_file())
+
+        call_command('sweep_orphaned_media', grace_hours=0, dry_run=True, stdout=StringIO())
+        self.assertTrue(storage.exists(orphan))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('sweep_orphaned_media', grace_hours=0, stdout=StringIO())
+
+        self.assertTrue(storage.exists(design_request.image.name))
+        self.assertTrue(all(storage.exists(name) for name in thumbnail_names(design_request.image.name)))
+        self.assertFalse(storage.exists(orphan))
+        self.assertFalse(any(storage.exists(name) for name in orphan_thumbnails))
+        self.assertFalse(storage.exists(lonely_thumbnail))
@@ -0,0 +1,156 @@
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from .cache import bump_requests_version, invalidate
+from .counters import record_status_change
+from .images import ensure_thumbnails
+from .models import DesignCategory, DesignRequest
+from .rollups import adjust_rollups, status_change_deltas
+from .routers import pin_to_primary
+from .signals import release_file
+
+TARGET_STATUSES = ('accepted', 'completed')
+
+
+def after_status_changes(changes, rollup_deltas):
+    # queryset.update и bulk_update не посылают сигналов: счётчики, сводки и версию кэша обновляем здесь
+    pin_to_primary()
+    for (old_status, new_status), count in changes.items():
+        record_status_change(old_status, new_status, count)
+    adjust_rollups(rollup_deltas)
+    invalidate(bump_requests_version)
+
+
+def bulk_transition(ids, new_status, admin_comment=''):
+    ids = {int(pk) for pk in ids}
+    admin_comment = admin_comment.strip()
+    # Старые статусы читаем с основной БД: по ним считаются поправки счётчиков и сводок
+    pin_to_primary()
+    if new_status not in TARGET_STATUSES:
+        return [], {pk: ['Неверный статус'] for pk in ids}
+
+    errors = {}
+    changed = []
+    changes = Counter()
+    rollup_deltas = Counter()
+    now = timezone.now()
+
+    with transaction.atomic():
+        design_requests = DesignRequest.objects.filter(id__in=ids).only(
+            'id', 'status', 'admin_comment', 'design_image', 'created_at', 'category'
+        ).annotate(category_deletion_requested_at=F('category__deletion_requested_at'))
+        for design_request in design_requests:
+            old_status = design_request.status
+            design_request.status = new_status
+            # bulk_update не вызывает pre_save и save(): auto_now и версию выставляем сами
+            design_request.updated_at = now
+            design_request.version = F('version') + 1
+            if admin_comment:
+                design_request.admin_comment = admin_comment
+
+            item_errors = design_request.status_errors()
+            if item_errors:
+                errors[design_request.id] = list(item_errors.values())
+                continue
+
+            changed.append(design_request)
+            # Заявки категории, помеченной на удаление, уже вычтены из счётчиков и сводок
+            if old_status != new_status and design_request.category_deletion_requested_at is None:
+                changes[old_status, new_status] += 1
+                rollup_deltas.update(status_change_deltas(
+                    design_request.created_at, design_request.category_id, old_status, new_status,
+                ))
+
+        for pk in ids - {design_request.id for design_request in changed} - errors.keys():
+            errors[pk] = ['Заявка не найдена']
+
+        DesignRequest.objects.bulk_update(changed, ['status', 'admin_comment', 'updated_at', 'version'], batch_size=500)
+        if changed:
+            after_status_changes(changes, rollup_deltas)
+
+    return sorted(design_request.id for design_request in changed), errors
+
+
+def _columns_sql(values, connection, separator):
+    # "колонка" = %s для полей заявки: для UPDATE/DELETE ... RETURNING, которых нет в QuerySet
+    fields = [DesignRequest._meta.get_field(name) for name in values]
+    sql = separator.join(f'"{field.column}" = %s' for field in fields)
+    return sql, [field.get_db_prep_save(value, connection) for field, value in zip(fields, values.values())]
+
+
+def transition_status(request_id, expected_status, expected_version, new_status, admin_comment, design_image=None):
+    """Меняет статус одним условным UPDATE без блокировки строки.
+
+    Возвращает False, если заявка уже не в статусе expected_status с версией expected_version
+    (её изменил или удалил другой менеджер).
+    """
+    pin_to_primary()
+    field = DesignRequest._meta.get_field('design_image')
+    db = router.db_for_write(DesignRequest)
+    conditions = {'id': request_id, 'status': expected_status, 'version': expected_version}
+    values = {
+        'status': new_status,
+        'admin_comment': admin_comment,
+        'updated_at': timezone.now(),
+    }
+
+    with transaction.atomic(using=db):
+        old_image = None
+        if design_image is not None:
+            # update() не сохраняет файлы: кладём в хранилище сами, в той же транзакции, что и UPDATE
+            old_image = DesignRequest.objects.using(db).filter(**conditions).values_list('design_image', flat=True).first()
+            values['design_image'] = field.storage.save(field.generate_filename(None, design_image.name), design_image)
+
+        assignments, assignment_params = _columns_sql(values, connections[db], ', ')
+        where, where_params = _columns_sql(conditions, connections[db], ' AND ')
+        # RETURNING отдаёт дату, категорию и пометку её удаления для сводок без отдельного SELECT после UPDATE
+        table, category_table = DesignRequest._meta.db_table, DesignCategory._meta.db_table
+        updated = list(DesignRequest.objects.raw(
+            f'UPDATE "{table}" SET {assignments}, "version" = "version" + 1 '
+            f'WHERE {where} RETURNING "id", "created_at", "category_id", '
+            f'(SELECT "deletion_requested_at" FROM "{category_table}" WHERE "{category_table}"."id" = "{table}"."category_id") '
+            f'AS "category_deletion_requested_at"',
+            [*assignment_params, *where_params],
+            using=db,
+        ))
+        if updated:
+            changes, rollup_deltas = Counter(), Counter()
+            # Заявки категории, помеченной на удаление, уже вычтены из счётчиков и сводок
+            if updated[0].category_deletion_requested_at is None:
+                changes[expected_status, new_status] = 1
+                rollup_deltas = status_change_deltas(updated[0].created_at, updated[0].category_id, expected_status, new_status)
+            after_status_changes(changes, rollup_deltas)
+            if old_image and old_image != values['design_image']:
+                release_file(field.storage, old_image)
+        elif design_image is not None:
+            field.storage.release(values['design_image'])
+
+    if not updated:
+        return False
+    if design_image is not None:
+        ensure_thumbnails(field.storage, values['design_image'])
+    return True
+
+
+def delete_request(**conditions):
+    """Удаляет заявку одним условным DELETE, если она ещё удовлетворяет conditions.
+
+    QuerySet.delete() сначала выбирает строки, а потом удаляет их по id — между этими запросами
+    заявку мог изменить другой менеджер. Здесь условие проверяется самим DELETE, а удалённая строка
+    возвращается через RETURNING и передаётся обработчикам post_delete (счётчики, сводки, файлы).
+    Возвращает True, если заявка удалена.
+    """
+    pin_to_primary()
+    db = router.db_for_write(DesignRequest)
+    where, params = _columns_sql(conditions, connections[db], ' AND ')
+    with transaction.atomic(using=db):
+        deleted = list(DesignRequest.objects.raw(
+            f'DELETE FROM "{DesignRequest._meta.db_table}" WHERE {where} RETURNING *', params, using=db,
+        ))
+        for design_request in deleted:
+            post_delete.send(sender=DesignRequest, instance=design_request, using=db, origin=design_request)
+    return bool(deleted)
@@ -1,19 +1,32 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'design_app'
 
-urlpatterns = [
-    path('', views.index, name='index'),
-    path('register/', views.register_view, name='register'),
-    path('login/', views.login_view, name='login'),
-    path('logout/', views.logout_view, name='logout'),
-    path('profile/', views.profile_view, name='profile'),
-    path('create-request/', views.create_request_view, name='create_request'),
-    path('delete-request/<int:request_id>/', views.delete_request_view, name='delete_request'),
-    path('manager/dashboard/', views.admin_dashboard, name='admin_dashboard'),
-    path('manager/requests/', views.admin_requests, name='admin_requests'),
-    path('manager/change-status/<int:request_id>/', views.change_request_status, name='change_status'),
-    path('manager/categories/', views.manage_categories, name='manage_categories'),
-    path('manager/delete-request/<int:request_id>/', views.admin_delete_request, name='admin_delete_request'),
-]
\ No newline at end of file
+
+def build_urlpatterns(use_async_views=False):
+    read_views = async_views if use_async_views else views
+    return [
+        path('', read_views.index, name='index'),
+        path('register/', views.register_view, name='register'),
+        path('login/', views.login_view, name='login'),
+        path('logout/', views.logout_view, name='logout'),
+        path('profile/', read_views.profile_view, name='profile'),
+        path('create-request/', views.create_request_view, name='create_request'),
+        path('delete-request/<int:request_id>/', views.delete_request_view, name='delete_request'),
+        path('manager/dashboard/', read_views.admin_dashboard, name='admin_dashboard'),
+        path('manager/requests/', read_views.admin_requests, name='admin_requests'),
+        path('manager/requests/export/<str:fmt>/', read_views.export_requests, name='export_requests'),
+        path('manager/analytics/', read_views.analytics_view, name='analytics'),
+        path('manager/change-status/<int:request_id>/', views.change_request_status, name='change_status'),
+        path('manager/change-status/bulk/', views.bulk_change_status, name='bulk_change_status'),
+        path('manager/categories/', views.manage_categories, name='manage_categories'),
+        path('manager/delete-request/<int:request_id>/', views.admin_delete_request, name='admin_delete_request'),
+        path('manager/metrics/', views.metrics_view, name='metrics'),
+        # Поток событий всегда асинхронный: под ASGI одно соединение не занимает поток воркера
+        path('manager/events/', async_views.live_events, name='live_events'),
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.DESIGN_APP_ASYNC_VIEWS)
@@ -1,9 +1,23 @@
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_POST, require_safe
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from .models import DesignRequest, DesignCategory
+from .cache import versioned
+from .categories import get_categories
+from .counters import get_counters
+from .deletion import request_category_deletion
+from .exports import export_response
+from .images import generate_field_thumbnails, ingest_image
+from .metrics import registry
+from .pagination import keyset_page
+from .rollups import cached_analytics, parse_days
+from .search import ranked, search_available
+from .transitions import bulk_transition, delete_request, transition_status
 from .forms import CustomUserCreationForm, LoginForm, DesignRequestForm, DesignCategoryForm
 
 
@@ -14,99 +28,171 @@ def is_admin(user):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    total_requests = DesignRequest.objects.count()
-    new_requests_count = DesignRequest.objects.filter(status='new').count()
-    accepted_requests_count = DesignRequest.objects.filter(status='accepted').count()
-    completed_requests_count = DesignRequest.objects.filter(status='completed').count()
-    categories_count = DesignCategory.objects.count()
+    counters = get_counters()
 
     context = {
-        'total_requests': total_requests,
-        'new_requests_count': new_requests_count,  # Передаем число, а не QuerySet
-        'accepted_requests_count': accepted_requests_count,
-        'completed_requests_count': completed_requests_count,
-        'categories_count': categories_count,
+        'total_requests': counters['total'],
+        'new_requests_count': counters['new'],  # Передаем число, а не QuerySet
+        'accepted_requests_count': counters['accepted'],
+        'completed_requests_count': counters['completed'],
+        'categories_count': counters['categories'],
+        'analytics': cached_analytics(),
     }
     return render(request, 'design_app/admin_dashboard.html', context)
 
+
+@login_required
+@user_passes_test(is_admin)
+@require_safe
+def analytics_view(request):
+    return JsonResponse(cached_analytics(parse_days(request.GET.get('days'))))
+
+
+@login_required
+@user_passes_test(is_admin)
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 @user_passes_test(is_admin)
 def admin_requests(request):
     status_filter = request.GET.get('status', '')
+    cursor = request.GET.get('after', '')
+    search_query = request.GET.get('q', '').strip()
 
+    design_requests = DesignRequest.objects.select_related('user', 'category')
     if status_filter:
-        design_requests = DesignRequest.objects.filter(status=status_filter).order_by('-created_at')
+        design_requests = design_requests.filter(status=status_filter)
+
+    if search_query and search_available():
+        # Результаты поиска упорядочены по релевантности, без постраничного курсора
+        design_requests, next_cursor = ranked(design_requests, search_query), None
     else:
-        design_requests = DesignRequest.objects.all().order_by('-created_at')
+        design_requests, next_cursor = keyset_page(design_requests, cursor)
 
     context = {
         'design_requests': design_requests,
         'current_filter': status_filter,
+        'search_query': search_query,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
     }
     return render(request, 'design_app/admin_requests.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+@require_safe
+def export_requests(request, fmt):
+    return export_response(request, fmt)
+
+
 @login_required
 @user_passes_test(is_admin)
 def change_request_status(request, request_id):
-    design_request = get_object_or_404(DesignRequest, id=request_id)
+    if request.method != 'POST':
+        design_request = get_object_or_404(DesignRequest.objects.select_related('user'), id=request_id)
+        return render(request, 'design_app/change_status.html', {'design_request': design_request})
 
-    if request.method == 'POST':
-        new_status = request.POST.get('status')
-        admin_comment = request.POST.get('admin_comment', '').strip()
-        design_image = request.FILES.get('design_image')
-
-        errors = {}
-
-        if new_status in ['accepted', 'completed']:
-            if new_status == 'accepted' and not admin_comment:
-                errors['admin_comment'] = 'Для статуса "Принято в работу" обязателен комментарий'
-
-            if new_status == 'completed' and not design_image:
-                errors['design_image'] = 'Для статуса "Выполнено" обязательно изображение дизайна'
-
-            if errors:
-                for field, error in errors.items():
-                    messages.error(request, error)
-                return render(request, 'design_app/change_status.html', {'design_request': design_request})
-
-            design_request.status = new_status
-            design_request.admin_comment = admin_comment
-
-            if new_status == 'completed' and design_image:
-                design_request.design_image = design_image
-
-            try:
-                design_request.full_clean()
-                design_request.save()
-                messages.success(request, f'Статус заявки изменен на "{design_request.get_status_display()}"')
-            except ValidationError as e:
-                for field, error_list in e.message_dict.items():
-                    for error in error_list:
-                        messages.error(request, f'{field}: {error}')
-        else:
-            messages.error(request, 'Неверный статус')
+    new_status = request.POST.get('status')
+    admin_comment = request.POST.get('admin_comment', '').strip()
+    design_image = request.FILES.get('design_image')
+
+    if new_status not in ['accepted', 'completed']:
+        messages.error(request, 'Неверный статус')
+        return redirect('design_app:admin_requests')
 
+    errors = {}
+    if new_status == 'accepted' and not admin_comment:
+        errors['admin_comment'] = 'Для статуса "Принято в работу" обязателен комментарий'
+
+    if new_status == 'completed' and not design_image:
+        errors['design_image'] = 'Для статуса "Выполнено" обязательно изображение дизайна'
+
+    if design_image:
+        try:
+            design_image = ingest_image(design_image)
+        except ValidationError as e:
+            errors['design_image'] = e.messages[0]
+
+    if errors:
+        for field, error in errors.items():
+            messages.error(request, error)
+        design_request = get_object_or_404(DesignRequest.objects.select_related('user'), id=request_id)
+        return render(request, 'design_app/change_status.html', {'design_request': design_request})
+
+    expected = _expected_state(request.POST)
+    if expected is None:
+        # Форма без версии (например, старая вкладка): сверяемся с текущим состоянием
+        current = get_object_or_404(DesignRequest.objects.only('status', 'version'), id=request_id)
+        expected = current.status, current.version
+
+    if transition_status(request_id, *expected, new_status, admin_comment, design_image if new_status == 'completed' else None):
+        messages.success(request, f'Статус заявки изменен на "{dict(DesignRequest.STATUS_CHOICES)[new_status]}"')
         return redirect('design_app:admin_requests')
 
-    return render(request, 'design_app/change_status.html', {'design_request': design_request})
+    design_request = get_object_or_404(DesignRequest.objects.select_related('user'), id=request_id)
+    messages.error(request, 'Заявку уже изменил другой менеджер. Проверьте текущий статус и повторите')
+    return render(request, 'design_app/change_status.html', {'design_request': design_request}, status=409)
+
+
+def _expected_state(data):
+    status = data.get('expected_status')
+    version = data.get('version', '')
+    if status not in dict(DesignRequest.STATUS_CHOICES) or not version.isdigit():
+        return None
+    return status, int(version)
 
 
 @login_required
 @user_passes_test(is_admin)
-def admin_delete_request(request, request_id):
+@require_POST
+def bulk_change_status(request):
+    ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+    new_status = request.POST.get('status')
+    admin_comment = request.POST.get('admin_comment', '')
+
+    updated, errors = bulk_transition(ids, new_status, admin_comment)
+
+    if request.headers.get('Accept', '').startswith('application/json'):
+        return JsonResponse({
+            'updated': updated,
+            'errors': {str(pk): item_errors for pk, item_errors in errors.items()},
+        }, status=200 if not errors else 207 if updated else 400, json_dumps_params={'ensure_ascii': False})
 
-    design_request = get_object_or_404(DesignRequest, id=request_id)
+    if updated:
+        messages.success(request, f'Статус изменен у заявок: {len(updated)}')
+    for pk, item_errors in sorted(errors.items()):
+        for error in item_errors:
+            messages.error(request, f'Заявка №{pk}: {error}')
+    if not ids:
+        messages.error(request, 'Не выбрано ни одной заявки')
 
+    return redirect(f"{reverse('design_app:admin_requests')}?{request.POST.get('query', '')}")
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_delete_request(request, request_id):
     if request.method == 'POST':
-        if design_request.status == 'new':
-            design_request.delete()
+        expected = _expected_state(request.POST)
+        conditions = {'id': request_id, 'status': 'new'}
+        if expected is not None:
+            conditions['version'] = expected[1]
+        # Проверка статуса и удаление — одним DELETE, без окна между чтением и записью
+        if delete_request(**conditions):
             messages.success(request, 'Заявка успешно удалена')
+        elif not DesignRequest.objects.filter(id=request_id).exists():
+            raise Http404('Заявка не найдена')
+        elif DesignRequest.objects.filter(id=request_id, status='new').exists():
+            messages.error(request, 'Заявку уже изменил другой менеджер. Проверьте её и повторите удаление')
         else:
             messages.error(request, 'Можно удалять только заявки со статусом "Новая"')
 
         return redirect('design_app:admin_requests')
 
+    design_request = get_object_or_404(DesignRequest.objects.select_related('user', 'category'), id=request_id)
     return render(request, 'design_app/admin_confirm_delete.html', {
         'design_request': design_request
     })
@@ -124,14 +210,13 @@ def manage_categories(request):
 
         elif 'delete_category' in request.POST:
             category_id = request.POST.get('category_id')
-            category = get_object_or_404(DesignCategory, id=category_id)
-            category_name = category.name
-            category.delete()
-            messages.success(request, f'Категория "{category_name}" удалена')
+            category = get_object_or_404(DesignCategory, id=category_id, deletion_requested_at__isnull=True)
+            request_category_deletion([category.id])
+            messages.success(request, f'Категория "{category.name}" удалена, её заявки удаляются в фоновом режиме')
 
         return redirect('design_app:manage_categories')
 
-    categories = DesignCategory.objects.all()
+    categories = get_categories()
     form = DesignCategoryForm()
     return render(request, 'design_app/manage_categories.html', {
         'categories': categories,
@@ -139,19 +224,19 @@ def manage_categories(request):
     })
 
 
-def index(request):
+def _index_data():
     completed_requests = DesignRequest.objects.filter(
         status='completed'
-    ).order_by('-created_at')[:4]
+    ).select_related('category').order_by('-created_at')[:4]
 
-    in_progress_count = DesignRequest.objects.filter(
-        status='accepted'
-    ).count()
-
-    context = {
-        'completed_requests': completed_requests,
-        'in_progress_count': in_progress_count,
+    return {
+        'completed_requests': list(completed_requests),
+        'in_progress_count': get_counters()['accepted'],
     }
+
+
+def index(request):
+    context = versioned('index', _index_data)
     return render(request, 'design_app/index.html', context)
 
 
@@ -204,7 +289,7 @@ def profile_view(request):
     if request.user.is_staff:
         return redirect('design_app:admin_dashboard')
 
-    user_requests = DesignRequest.objects.filter(user=request.user)
+    user_requests = DesignRequest.objects.filter(user=request.user).select_related('category')
     return render(request, 'design_app/profile.html', {'user_requests': user_requests})
 
 
@@ -219,6 +304,7 @@ def create_request_view(request):
             design_request = form.save(commit=False)
             design_request.user = request.user
             design_request.save()
+            generate_field_thumbnails(design_request.image)
             messages.success(request, 'Заявка успешно создана!')
             return redirect('design_app:profile')
     else:
@@ -232,11 +318,11 @@ def delete_request_view(request, request_id):
     if request.user.is_staff:
         return redirect('design_app:admin_dashboard')
 
-    design_request = get_object_or_404(DesignRequest, id=request_id, user=request.user)
-
-    if design_request.can_be_deleted():
-        design_request.delete()
+    # Условное удаление: менеджер мог принять заявку в работу между показом страницы и нажатием кнопки
+    if delete_request(id=request_id, user=request.user.pk, status='new'):
         messages.success(request, 'Заявка удалена')
+    elif not DesignRequest.objects.filter(id=request_id, user=request.user).exists():
+        raise Http404('Заявка не найдена')
     else:
         messages.error(request, 'Невозможно удалить заявку')
 
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'design_project.settings')
+# Читается в settings: постоянные соединения с БД под ASGI отключены (CONN_MAX_AGE = 0)
+os.environ.setdefault('DESIGN_APP_ASGI', '1')
 
 application = get_asgi_application()
@@ -43,23 +43,62 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'design_app.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'design_app.middleware.QueryInspectionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'design_app.middleware.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'design_project.urls'
 
+# Категории с заявками удаляются фоновым потоком после ответа; при False — только командой purge_categories
+CATEGORY_DELETION_IN_BACKGROUND = True
+
+# Подсчёт SQL-запросов и поиск N+1 (design_app.middleware.QueryInspectionMiddleware)
+QUERY_INSPECTION = DEBUG
+QUERY_BUDGET_STRICT = False
+QUERY_REPEAT_THRESHOLD = 3
+
+# Максимум запросов на один HTTP-запрос, включая сессию и пользователя при холодном кэше
+QUERY_BUDGETS = {
+    'design_app:index': 4,
+    'design_app:register': 12,
+    'design_app:login': 10,
+    'design_app:logout': 5,
+    'design_app:profile': 4,
+    'design_app:create_request': 16,
+    'design_app:delete_request': 14,
+    'design_app:admin_dashboard': 4,
+    'design_app:admin_requests': 4,
+    'design_app:export_requests': 3,
+    'design_app:analytics': 4,
+    'design_app:change_status': 18,
+    'design_app:bulk_change_status': 11,
+    'design_app:manage_categories': 8,
+    'design_app:admin_delete_request': 14,
+    'design_app:metrics': 3,
+    'design_app:live_events': 5,
+}
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с учётом времени рендеринга для RequestMetricsMiddleware
+        'BACKEND': 'design_app.metrics.InstrumentedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны хранятся в памяти процесса; при DEBUG автоперезагрузка сбрасывает кэш
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -71,6 +110,22 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'design_project.wsgi.application'
+ASGI_APPLICATION = 'design_project.asgi.application'
+
+# Асинхронные версии index, profile, admin_requests и admin_dashboard (для запуска под ASGI)
+DESIGN_APP_ASYNC_VIEWS = os.environ.get('DESIGN_APP_ASYNC_VIEWS', '') == '1'
+# Выставляет design_project/asgi.py: под ASGI синхронный код запроса идёт в потоках sync_to_async,
+# и постоянные соединения не переиспользуются, а копятся до CONN_MAX_AGE — там они отключены
+DESIGN_APP_ASGI = os.environ.get('DESIGN_APP_ASGI', '') == '1'
+
+# Server-sent events панели управления: как часто сверять версии кэша, сверяться со счётчиками
+# в БД независимо от кэша, слать комментарий-пинг и сколько держать одно соединение.
+# Под WSGI поток не держится: браузер переспрашивает снимок раз в LIVE_EVENTS_WSGI_RETRY_SECONDS
+LIVE_EVENTS_POLL_SECONDS = 1
+LIVE_EVENTS_RESYNC_SECONDS = 15
+LIVE_EVENTS_HEARTBEAT_SECONDS = 15
+LIVE_EVENTS_STREAM_SECONDS = 300
+LIVE_EVENTS_WSGI_RETRY_SECONDS = 30
 
 
 # Database
@@ -80,10 +135,87 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 0 if DESIGN_APP_ASGI else 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Писатели сразу берут блокировку записи и ждут её, а не падают на повышении блокировки
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+# Реплики только для чтения для DesignRequest/DesignCategory (design_app.routers).
+# Локально: скопировать db.sqlite3 и указать путь к копии в DESIGN_APP_REPLICA_DB.
+DATABASE_REPLICAS = []
+if os.environ.get('DESIGN_APP_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DESIGN_APP_REPLICA_DB'],
+        # Реплика только читает: блокировка записи при открытии транзакции не нужна
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'transaction_mode': 'DEFERRED'},
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['design_app.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи запросы пользователя читают с основной БД
+REPLICA_PIN_SECONDS = 10
+
+# Применяются к каждому новому соединению SQLite (design_app.db.configure_connection)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Через кэш все процессы узнают о выходе пользователя, смене пароля и прав, о новых версиях
+# заявок и категорий, поэтому при нескольких процессах он должен быть общим: Redis
+# (DESIGN_APP_REDIS_URL) или, без внешнего сервера, каталог на диске (DESIGN_APP_CACHE_DIR).
+# LocMemCache по умолчанию годится только для одного процесса (runserver, тесты).
+
+if os.environ.get('DESIGN_APP_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DESIGN_APP_REDIS_URL'],
+        }
+    }
+elif os.environ.get('DESIGN_APP_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['DESIGN_APP_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'design-app',
+        }
+    }
+
+SHARED_CACHE = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+
+# Sessions and authentication
+# С общим кэшем сессии читаются из кэша (с записью в БД), пользователь сессии — тоже из кэша.
+# С LocMemCache сброс в одном процессе не дошёл бы до остальных, поэтому тогда читаем из БД.
+# Просроченные сессии удаляет purge_sessions (порциями, в отличие от clearsessions).
+
+if SHARED_CACHE:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTHENTICATION_BACKENDS = ['design_app.backends.CachedModelBackend']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -127,6 +259,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Отдача медиа: None — через FileResponse (os.sendfile в gunicorn/uwsgi),
+# 'x-accel-redirect' — передать nginx, 'x-sendfile' — Apache/lighttpd
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+# Файлы с хэшем содержимого в имени кэшируются на год, остальные (загруженные до хранения
+# по хэшу, их можно перезаписать) — ненадолго, с проверкой по ETag
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_MUTABLE_CACHE_MAX_AGE = 60
+
 AUTH_USER_MODEL = 'design_app.CustomUser'
 
 LOGIN_URL = 'design_app:login'